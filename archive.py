@@ -0,0 +1,278 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator archive of every saved batch
+
+Each batch is a save file of store.py, named after its id in a directory
+per lottery. An SQLite index of the batches by lottery type and date
+finds a batch, or the batches saved in a date range, without opening
+any of the files.
+
+Several processes can share an archive. The index is in SQLite's
+write-ahead log mode, so readers and the writer do not block each other,
+and a batch is only entered in the index once its file is complete, in
+a transaction that lasts no longer than renaming the file.
+"""
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Tuple, Union
+import sqlite3
+import time
+import constants as C
+import rules
+import store
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY,
+    lottery_type INTEGER NOT NULL,
+    date REAL NOT NULL,
+    lines INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS batches_by_date ON batches (lottery_type, date);
+"""
+
+
+class BatchInfo(NamedTuple):
+    """The index entry of an archived batch
+    """
+
+    batch_id: int
+    lottery_type: int
+    # time.time() when the batch was saved
+    date: float
+    lines: int
+
+
+class Archive:
+    """The archive of saved batches in a directory
+    """
+
+    def __init__(self, directory: str = C.ARCHIVE_DIR) -> None:
+        self.directory = Path(directory)
+        if not self.directory.exists():
+            self.directory.mkdir(parents=True)
+        self._index = sqlite3.connect(
+            str(self.directory / C.ARCHIVE_INDEX), timeout=C.ARCHIVE_TIMEOUT
+        )
+        self._index.execute("PRAGMA journal_mode=WAL")
+        self._index.executescript(SCHEMA)
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the index
+
+        :return: None
+        """
+        self._index.close()
+
+    def batch_path(self, info: BatchInfo) -> Path:
+        """Return the path of the save file of a batch
+
+        :param info: the batch
+        :return: the path of its save file
+        """
+        name: str = rules.get_rule(info.lottery_type).name
+        return self.directory / name / f"{info.batch_id:08d}{C.SAVE_FILE_TYPE}"
+
+    def add(
+        self,
+        lottery_type: int,
+        buffer,
+        date: Union[float, None] = None,
+        encoding: int = C.STORE_PACKED,
+        codec: int = C.STORE_ZLIB,
+    ) -> BatchInfo:
+        """Save a batch of packed lines as a new archived batch
+
+        :param lottery_type: int the rule id of the lottery, see rules.py
+        :param buffer: bytes like object of the packed lines
+        :param date: time the batch was saved, None for now
+        :param encoding: C.STORE_PACKED, C.STORE_RANKED or C.STORE_BLOCKED
+        :param codec: the compression of C.STORE_BLOCKED, one of
+        C.STORE_CODECS
+        :return: the index entry of the new batch
+        """
+        return self.add_stream(lottery_type, (buffer,), date, encoding, codec)
+
+    def add_stream(
+        self,
+        lottery_type: int,
+        chunks: Iterable,
+        date: Union[float, None] = None,
+        encoding: int = C.STORE_PACKED,
+        codec: int = C.STORE_ZLIB,
+    ) -> BatchInfo:
+        """Save a stream of chunks of packed lines as a new archived batch
+
+        :param lottery_type: int the rule id of the lottery, see rules.py
+        :param chunks: bytes like objects of whole packed lines
+        :param date: time the batch was saved, None for now
+        :param encoding: C.STORE_PACKED, C.STORE_RANKED or C.STORE_BLOCKED
+        :param codec: the compression of C.STORE_BLOCKED, one of
+        C.STORE_CODECS
+        :return: the index entry of the new batch
+        """
+        date = time.time() if date is None else date
+        # the file is named after the id of the batch, which is only known
+        # once it is in the index, so it is written under a placeholder
+        placeholder = self.batch_path(BatchInfo(0, lottery_type, date, 0))
+        # leaving the with block on an exception, e.g. when generation is
+        # cancelled, removes the partial file and rolls back the index
+        writer = store.BatchWriter(
+            str(placeholder), lottery_type, date, encoding, codec
+        )
+        with writer:
+            for chunk in chunks:
+                writer.write(chunk)
+            # the file is complete and on disk before the index is locked
+            header = writer.finish()
+            with self._index:
+                cursor = self._index.execute(
+                    "INSERT INTO batches (lottery_type, date, lines) VALUES (?, ?, ?)",
+                    (lottery_type, date, header.lines),
+                )
+                info = BatchInfo(cursor.lastrowid, lottery_type, date, header.lines)
+                writer.commit(str(self.batch_path(info)))
+        return info
+
+    def _select(self, where: str, args: tuple) -> List[BatchInfo]:
+        """Return the index entries matching a condition
+
+        :param where: SQL condition and ordering
+        :param args: the parameters of the condition
+        :return: the matching batches
+        """
+        rows = self._index.execute(
+            "SELECT id, lottery_type, date, lines FROM batches " + where, args
+        )
+        return [BatchInfo(*row) for row in rows]
+
+    def get(self, batch_id: int) -> Union[BatchInfo, None]:
+        """Return a batch by its id
+
+        :param batch_id: the id of the batch
+        :return: the batch or None if there is none
+        """
+        found = self._select("WHERE id = ?", (batch_id,))
+        return found[0] if found else None
+
+    def latest(self, lottery_type: int) -> Union[BatchInfo, None]:
+        """Return the most recently saved batch of a lottery
+
+        :param lottery_type: int the rule id of the lottery, see rules.py
+        :return: the batch or None if there is none
+        """
+        return self.find(lottery_type, float("inf"))
+
+    def find(self, lottery_type: int, date: float) -> Union[BatchInfo, None]:
+        """Return the batch of a lottery saved at or last before a time
+
+        :param lottery_type: int the rule id of the lottery, see rules.py
+        :param date: the time, as time.time()
+        :return: the batch or None if there is none
+        """
+        found = self._select(
+            "WHERE lottery_type = ? AND date <= ? "
+            "ORDER BY date DESC, id DESC LIMIT 1",
+            (lottery_type, date),
+        )
+        return found[0] if found else None
+
+    def batches(
+        self,
+        lottery_type: Union[int, None] = None,
+        start: float = float("-inf"),
+        end: float = float("inf"),
+    ) -> List[BatchInfo]:
+        """Return the batches saved in a date range, oldest first
+
+        :param lottery_type: int the rule id of the lottery, None for
+        every lottery
+        :param start: the earliest time, as time.time()
+        :param end: the latest time, as time.time()
+        :return: the batches
+        """
+        if lottery_type is None:
+            return self._select(
+                "WHERE date BETWEEN ? AND ? ORDER BY date, id", (start, end)
+            )
+        return self._select(
+            "WHERE lottery_type = ? AND date BETWEEN ? AND ? ORDER BY date, id",
+            (lottery_type, start, end),
+        )
+
+    def open(self, info: BatchInfo) -> Tuple[store.Header, memoryview]:
+        """Open the packed lines of an archived batch
+
+        :param info: the batch
+        :return: the header and a memory mapped view of the packed lines
+        """
+        return store.map_batch(str(self.batch_path(info)))
+
+    def reader(self, info: BatchInfo) -> store.BatchReader:
+        """Open an archived batch for reading lines at random
+
+        :param info: the batch
+        :return: a reader of the lines of its save file
+        """
+        return store.BatchReader(str(self.batch_path(info)))
+
+    def recode(
+        self, info: BatchInfo, encoding: int, codec: int = C.STORE_ZLIB
+    ) -> Tuple[int, int]:
+        """Rewrite the save file of a batch in another encoding, e.g. to
+        compress an old batch
+
+        The new file replaces the old one atomically, the index is
+        unchanged as the lines are the same. The old file is kept if the
+        new one is not smaller, e.g. a batch of a few lines, too short for
+        compression to pay for the block index.
+
+        :param info: the batch
+        :param encoding: C.STORE_PACKED, C.STORE_RANKED or C.STORE_BLOCKED
+        :param codec: the compression of C.STORE_BLOCKED, one of
+        C.STORE_CODECS
+        :return: the size of the file before and after
+        """
+        path = self.batch_path(info)
+        before: int = path.stat().st_size
+        with store.BatchReader(str(path)) as reader:
+            header = reader.header
+            if header.encoding == encoding and (
+                encoding != C.STORE_BLOCKED or header.codec == codec
+            ):
+                return before, before
+            writer = store.BatchWriter(
+                str(path), header.lottery_type, header.date, encoding, codec
+            )
+            try:
+                step: int = C.STORE_COPY_LINES
+                for start in range(0, header.lines, step):
+                    writer.write(reader.get_lines(start, start + step))
+                writer.finish()
+                if writer.file_size >= before:
+                    writer.abort()
+                    return before, before
+                writer.commit()
+            except BaseException:
+                writer.abort()
+                raise
+        return before, writer.file_size
+
+    def delete(self, info: BatchInfo) -> None:
+        """Remove a batch from the archive
+
+        :param info: the batch
+        :return: None
+        """
+        with self._index:
+            self._index.execute("DELETE FROM batches WHERE id = ?", (info.batch_id,))
+            path = self.batch_path(info)
+            if path.exists():
+                path.unlink()
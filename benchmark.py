@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator benchmarks of the generation, persistence and
+display paths
+
+Every case is run with a fixed seed and the best of several repeats is
+reported as JSON. Given a baseline file of an earlier run any case that
+became slower by more than the tolerance is reported as a regression.
+
+    python benchmark.py --output results.json
+    python benchmark.py --baseline results.json
+"""
+from pathlib import Path
+from random import Random
+from typing import Callable, Dict, List, Union
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import constants as C
+import engine
+import rules
+import store
+
+# seed used by every case, so runs generate the same lines
+SEED: int = 2019
+# default line counts of the save/load cases
+SIZES: List[int] = [10 ** exponent for exponent in range(2, 8)]
+# the shelf format writes one key per number group, larger sizes
+# take too long to be useful
+MAX_SHELF_LINES: int = 10 ** 5
+# number of calls of choose_numbers timed per lottery
+CHOOSE_CALLS: int = 100000
+# fraction a case may be slower than the baseline
+TOLERANCE: float = 0.2
+
+
+def measure(action: Callable[[], None], repeat: int) -> float:
+    """Time an action several times
+
+    :param action: the action to time
+    :param repeat: the number of times to run it
+    :return: the shortest time in seconds
+    """
+    best: float = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def record(seconds: float, items: int, unit: str) -> Dict[str, float]:
+    """Return the result of a case
+
+    :param seconds: the time taken
+    :param items: the number of items processed in that time
+    :param unit: the name of the items
+    :return: the result as a dictionary
+    """
+    return {
+        "seconds": seconds,
+        "items": items,
+        "unit": unit,
+        "per_second": items / seconds if seconds else float("inf"),
+    }
+
+
+def sample_data(lottery_type: int, number_of_lines: int) -> bytes:
+    """Return packed lines for the storage and display cases
+
+    Up to C.STREAM_CHUNK_LINES distinct lines are generated and repeated,
+    the content of larger batches does not affect their timings.
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param number_of_lines: the number of lines
+    :return: the packed lines
+    """
+    distinct: int = min(number_of_lines, C.STREAM_CHUNK_LINES)
+    chunk: bytes = next(engine.generate_chunks(lottery_type, distinct, SEED))
+    copies: int = -(-number_of_lines // distinct)
+    return (chunk * copies)[: len(chunk) // distinct * number_of_lines]
+
+
+def bench_choose_numbers(repeat: int) -> Dict[str, dict]:
+    """Time choose_numbers for the groups of every lottery
+
+    :param repeat: the number of times to run each case
+    :return: the results by case name
+    """
+    results: Dict[str, dict] = {}
+    for rule in rules.RULES:
+
+        def action() -> None:
+            rng = Random(SEED)
+            for _ in range(CHOOSE_CALLS):
+                engine.choose_numbers(rule.main_max, rule.main_qty, rng)
+                if rule.extra_qty:
+                    engine.choose_numbers(rule.extra_max, rule.extra_qty, rng)
+
+        seconds = measure(action, repeat)
+        results[f"choose_numbers/{rule.name}"] = record(seconds, CHOOSE_CALLS, "lines")
+    return results
+
+
+def bench_bulk(repeat: int, sizes: List[int]) -> Dict[str, dict]:
+    """Time the NumPy bulk generator, if NumPy is installed
+
+    :param repeat: the number of times to run each case
+    :param sizes: the line counts to generate
+    :return: the results by case name
+    """
+    try:
+        import bulk
+    except ImportError:
+        return {}
+    results: Dict[str, dict] = {}
+    for rule in rules.RULES:
+        number_of_lines: int = max(sizes)
+        for method in C.BULK_METHODS:
+            seconds = measure(
+                lambda: bulk.generate_bulk(
+                    rule.rule_id, number_of_lines, SEED, method
+                ),
+                repeat,
+            )
+            results[f"generate_bulk/{method}/{rule.name}"] = record(
+                seconds, number_of_lines, "lines"
+            )
+    return results
+
+
+def bench_rng(repeat: int, sizes: List[int]) -> Dict[str, dict]:
+    """Time generating lines with every random number generator backend
+
+    :param repeat: the number of times to run each case
+    :param sizes: the line counts to generate
+    :return: the results by case name
+    """
+    results: Dict[str, dict] = {}
+    lottery_type: int = C.LOTTERY_DEFAULT
+    try:
+        import bulk
+    except ImportError:
+        bulk = None
+    for backend in C.RNG_BACKENDS:
+        # the secrets backend can not be seeded
+        seed = None if backend == C.RNG_SECRETS else SEED
+        seconds = measure(
+            lambda: engine.generate_lines(
+                lottery_type, CHOOSE_CALLS, seed, backend=backend
+            ),
+            repeat,
+        )
+        results[f"rng/engine/{backend}"] = record(seconds, CHOOSE_CALLS, "lines")
+        if bulk is None:
+            continue
+        number_of_lines: int = max(sizes)
+        seconds = measure(
+            lambda: bulk.generate_bulk(
+                lottery_type, number_of_lines, seed, backend=backend
+            ),
+            repeat,
+        )
+        results[f"rng/bulk/{backend}"] = record(seconds, number_of_lines, "lines")
+    return results
+
+
+def bench_storage(repeat: int, sizes: List[int], directory: Path) -> Dict[str, dict]:
+    """Time saving and loading batches with the shelf format and store.py
+
+    :param repeat: the number of times to run each case
+    :param sizes: the line counts to save and load
+    :param directory: a directory for the files
+    :return: the results by case name
+    """
+    results: Dict[str, dict] = {}
+    lottery_type: int = C.LOTTERY_DEFAULT
+    for number_of_lines in sizes:
+        data = sample_data(lottery_type, number_of_lines)
+        file_name = str(directory / f"store{number_of_lines}{C.SAVE_FILE_TYPE}")
+        seconds = measure(
+            lambda: store.write_batch(file_name, lottery_type, data), repeat
+        )
+        results[f"store_save/{number_of_lines}"] = record(
+            seconds, number_of_lines, "lines"
+        )
+        seconds = measure(lambda: store.read_batch(file_name), repeat)
+        results[f"store_load/{number_of_lines}"] = record(
+            seconds, number_of_lines, "lines"
+        )
+        seconds = measure(lambda: bytes(store.map_batch(file_name)[1]), repeat)
+        results[f"store_map/{number_of_lines}"] = record(
+            seconds, number_of_lines, "lines"
+        )
+
+        if number_of_lines > MAX_SHELF_LINES:
+            continue
+        lines = engine.generate_lines(lottery_type, number_of_lines, SEED)
+        shelf_name = str(directory / f"shelf{number_of_lines}")
+        seconds = measure(
+            lambda: engine.save_lines(shelf_name, lottery_type, lines), repeat
+        )
+        results[f"shelf_save/{number_of_lines}"] = record(
+            seconds, number_of_lines, "lines"
+        )
+        seconds = measure(lambda: engine.load_lines(shelf_name), repeat)
+        results[f"shelf_load/{number_of_lines}"] = record(
+            seconds, number_of_lines, "lines"
+        )
+    return results
+
+
+def bench_results_frame(repeat: int, sizes: List[int]) -> Dict[str, dict]:
+    """Time building the results frame, if wxPython and a display,
+    e.g. a virtual one started with xvfb-run, are available
+
+    :param repeat: the number of times to run each case
+    :param sizes: the line counts to display
+    :return: the results by case name
+    """
+    try:
+        import wx
+        from common import ResultsData
+        from data_gui import ResultsFrame
+
+        app = wx.App()
+    except (ImportError, SystemExit) as error:
+        return {"results_frame": {"skipped": str(error) or "no display"}}
+
+    results: Dict[str, dict] = {}
+    for number_of_lines in sizes:
+        result = ResultsData(C.LOTTERY_DEFAULT)
+        result.set_buffer(sample_data(C.LOTTERY_DEFAULT, number_of_lines))
+
+        def action() -> None:
+            frame = ResultsFrame(None, result)
+            frame.Show()
+            wx.SafeYield()
+            frame.Destroy()
+
+        seconds = measure(action, repeat)
+        results[f"results_frame/{number_of_lines}"] = record(
+            seconds, number_of_lines, "lines"
+        )
+    app.Destroy()
+    return results
+
+
+def run(repeat: int, sizes: List[int], cases: List[str]) -> dict:
+    """Run the benchmark cases
+
+    :param repeat: the number of times to run each case
+    :param sizes: the line counts of the sized cases
+    :param cases: the groups of cases to run
+    :return: the report with the results by case name
+    """
+    results: Dict[str, dict] = {}
+    if "choose" in cases:
+        results.update(bench_choose_numbers(repeat))
+    if "bulk" in cases:
+        results.update(bench_bulk(repeat, sizes))
+    if "rng" in cases:
+        results.update(bench_rng(repeat, sizes))
+    if "storage" in cases:
+        with tempfile.TemporaryDirectory() as directory:
+            results.update(bench_storage(repeat, sizes, Path(directory)))
+    if "display" in cases:
+        results.update(bench_results_frame(repeat, sizes))
+    return {
+        "version": C.VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Find the cases slower than in a baseline report
+
+    :param report: the report of this run
+    :param baseline: the report of an earlier run
+    :param tolerance: fraction a case may be slower than the baseline
+    :return: a description of every regression
+    """
+    regressions: List[str] = []
+    for case, result in report["results"].items():
+        previous = baseline["results"].get(case)
+        if previous is None or "seconds" not in previous or "seconds" not in result:
+            continue
+        ratio: float = result["seconds"] / previous["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{case}: {previous['seconds']:.6f}s -> "
+                f"{result['seconds']:.6f}s ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def main(argv: Union[List[str], None] = None) -> int:
+    """Benchmark main
+
+    :param argv: the command line arguments, None for sys.argv
+    :return: int 1 if a regression was found, else 0
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=SIZES, help="line counts"
+    )
+    parser.add_argument(
+        "--cases",
+        nargs="+",
+        choices=["choose", "bulk", "rng", "storage", "display"],
+        default=["choose", "bulk", "rng", "storage", "display"],
+    )
+    parser.add_argument("--output", help="file to write the JSON report to")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    report = run(args.repeat, args.sizes, args.cases)
+    text: str = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,406 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Vectorized bulk line generation using NumPy
+
+Lines are generated as NumPy matrices, many times faster than the
+pure Python engine.generate_lines for large batches.
+
+Lines are drawn either by sampling the numbers of each group
+(C.BULK_SAMPLE) or by drawing uniform ranks and unranking them
+(C.BULK_RANK), see combinatorics.py, with any of the random number
+generators of randomness.py.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterator, NamedTuple, Tuple, Union
+import collections
+import functools
+import os
+import numpy as np
+import combinatorics
+import constants as C
+import engine
+import randomness
+import rules
+import store
+
+
+class BulkLines(NamedTuple):
+    """A batch of lines as two matrices, one row per line
+    """
+
+    # sorted main numbers, shape (number_of_lines, main_qty)
+    main: np.ndarray
+    # sorted extra numbers, shape (number_of_lines, extra_qty)
+    extra: np.ndarray
+
+    def __len__(self) -> int:
+        return self.main.shape[0]
+
+    def packed(self) -> np.ndarray:
+        """Return the lines packed as ResultsData and store.py hold them
+
+        :return: uint8 matrix of the main then the extra numbers
+        """
+        return np.hstack((self.main, self.extra))
+
+    def to_lines(self) -> [engine.Line]:
+        """Convert to engine lines, only sensible for small batches
+
+        :return: a list of engine.Line
+        """
+        return [
+            engine.Line(tuple(main), tuple(extra))
+            for main, extra in zip(self.main.tolist(), self.extra.tolist())
+        ]
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """Return the number of bits set in every element
+
+    :param values: uint64 array
+    :return: array of the bit counts
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    table = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+    counts = table[values.view(np.uint8)].reshape(values.shape + (8,))
+    return counts.sum(axis=-1, dtype=np.uint8)
+
+
+def sample_matrix(
+    maximum: int, quantity: int, number_of_lines: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Choose quantity distinct numbers for every line in one go
+
+    Floyd's sampling algorithm is applied to all lines at once, so there
+    is one vectorized step per column rather than one call per line.
+
+    :param maximum: the highest number to choose from plus 1
+    :param quantity: the number of numbers in each line
+    :param number_of_lines: the number of lines to generate
+    :param rng: the random number generator to use
+    :return: uint8 matrix of sorted numbers, one row per line
+    """
+    population: int = maximum - C.RULE_START
+    if maximum > np.iinfo(np.uint8).max + 1:
+        raise ValueError(f"Numbers up to {maximum - 1} do not fit in uint8")
+    if quantity > population:
+        raise ValueError(f"Cannot choose {quantity} of {population} numbers")
+
+    chosen = np.empty((number_of_lines, quantity), dtype=np.uint8)
+    for column, top in enumerate(range(population - quantity, population)):
+        pick = rng.integers(0, top, endpoint=True, size=number_of_lines)
+        pick = pick.astype(np.uint8)
+        # a number already chosen in this line is replaced by top which
+        # can not have been chosen yet
+        taken = (chosen[:, :column] == pick[:, np.newaxis]).any(axis=1)
+        chosen[:, column] = np.where(taken, top, pick)
+    chosen.sort(axis=1)
+    chosen += C.RULE_START
+    return chosen
+
+
+@functools.lru_cache(maxsize=None)
+def rank_tables(maximum: int, quantity: int) -> np.ndarray:
+    """Return combinatorics.comb_table as a matrix, built once per group
+
+    :param maximum: the highest number plus 1
+    :param quantity: the number of numbers in a group
+    :return: read only int64 matrix, table[position, value]
+    """
+    table = np.array(
+        combinatorics.comb_table(maximum - C.RULE_START, quantity), dtype=np.int64
+    ).reshape(quantity, maximum - C.RULE_START)
+    table.setflags(write=False)
+    return table
+
+
+def check_rankable(rule: rules.Rule) -> int:
+    """Check the ranks of a lottery fit in an int64
+
+    :param rule: the rules of the lottery
+    :return: int the number of possible lines
+    """
+    count: int = combinatorics.line_count(rule)
+    if count > np.iinfo(np.int64).max:
+        raise ValueError(f"{rule.name}: too many lines to rank with NumPy")
+    return count
+
+
+def rank_group_matrix(numbers: np.ndarray, maximum: int) -> np.ndarray:
+    """Return the colex rank of every row of sorted numbers
+
+    :param numbers: matrix of sorted numbers, one row per group
+    :param maximum: the highest number plus 1
+    :return: int64 vector of ranks
+    """
+    table = rank_tables(maximum, numbers.shape[1])
+    ranks = np.zeros(numbers.shape[0], dtype=np.int64)
+    for position in range(numbers.shape[1]):
+        ranks += table[position, numbers[:, position].astype(np.intp) - C.RULE_START]
+    return ranks
+
+
+def unrank_group_matrix(
+    ranks: np.ndarray, quantity: int, maximum: int
+) -> np.ndarray:
+    """Return the sorted numbers of every colex rank
+
+    :param ranks: vector of ranks, below the number of possible groups
+    :param quantity: the number of numbers in each group
+    :param maximum: the highest number plus 1
+    :return: uint8 matrix of sorted numbers, one row per rank
+    """
+    table = rank_tables(maximum, quantity)
+    ranks = ranks.astype(np.int64)
+    numbers = np.empty((ranks.shape[0], quantity), dtype=np.uint8)
+    for position in range(quantity - 1, -1, -1):
+        # the largest value whose combination count does not exceed rank
+        value = np.searchsorted(table[position], ranks, side="right") - 1
+        ranks -= table[position, value]
+        numbers[:, position] = value + C.RULE_START
+    return numbers
+
+
+def rank_lines(lottery_type: int, lines: BulkLines) -> np.ndarray:
+    """Return the rank of every line, as combinatorics.rank_line
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param lines: the lines to rank
+    :return: int64 vector of ranks
+    """
+    rule = rules.get_rule(lottery_type)
+    check_rankable(rule)
+    ranks = rank_group_matrix(lines.main, rule.main_max)
+    if rule.extra_qty:
+        ranks *= combinatorics.group_count(rule.extra_max, rule.extra_qty)
+        ranks += rank_group_matrix(lines.extra, rule.extra_max)
+    return ranks
+
+
+def unrank_lines(lottery_type: int, ranks: np.ndarray) -> BulkLines:
+    """Return the line of every rank, as combinatorics.unrank_line
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param ranks: vector of ranks, below combinatorics.line_count
+    :return: the lines
+    """
+    rule = rules.get_rule(lottery_type)
+    check_rankable(rule)
+    ranks = np.asarray(ranks, dtype=np.int64)
+    if not rule.extra_qty:
+        main = unrank_group_matrix(ranks, rule.main_qty, rule.main_max)
+        return BulkLines(main, np.empty((ranks.shape[0], 0), dtype=np.uint8))
+    ranks, extra = np.divmod(
+        ranks, combinatorics.group_count(rule.extra_max, rule.extra_qty)
+    )
+    return BulkLines(
+        unrank_group_matrix(ranks, rule.main_qty, rule.main_max),
+        unrank_group_matrix(extra, rule.extra_qty, rule.extra_max),
+    )
+
+
+def encode_ranks(lottery_type: int, lines: BulkLines) -> np.ndarray:
+    """Encode lines as combinatorics.encode_ranks does
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param lines: the lines to encode
+    :return: uint8 matrix of little endian ranks, one row per line
+    """
+    width: int = combinatorics.rank_width(rules.get_rule(lottery_type))
+    ranks = rank_lines(lottery_type, lines).astype("<u8")
+    return ranks.view(np.uint8).reshape(-1, 8)[:, :width]
+
+
+def decode_ranks(lottery_type: int, data) -> BulkLines:
+    """Decode lines encoded by combinatorics.encode_ranks
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param data: bytes like object of the encoded ranks
+    :return: the lines
+    """
+    width: int = combinatorics.rank_width(rules.get_rule(lottery_type))
+    encoded = np.frombuffer(data, dtype=np.uint8).reshape(-1, width)
+    padded = np.zeros((encoded.shape[0], 8), dtype=np.uint8)
+    padded[:, :width] = encoded
+    return unrank_lines(lottery_type, padded.view("<u8").ravel())
+
+
+def generate_bulk(
+    lottery_type: int,
+    number_of_lines: int,
+    seed: Union[int, np.random.SeedSequence, np.random.Generator, None] = None,
+    method: str = C.BULK_SAMPLE,
+    backend: str = C.RNG_BULK_DEFAULT,
+) -> BulkLines:
+    """Generate a large batch of lines for a lottery
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param number_of_lines: the number of lines to generate
+    :param seed: seed for a reproducible run, None for a random one, or
+    a generator to carry on drawing from, see randomness.numpy_generator
+    :param method: C.BULK_SAMPLE or C.BULK_RANK
+    :param backend: the random number generator, one of C.RNG_BACKENDS
+    :return: the generated lines
+    """
+    if number_of_lines < C.MIN_LINES:
+        raise ValueError(f"At least {C.MIN_LINES} line(s) must be generated")
+    rule = rules.get_rule(lottery_type)
+    rng = randomness.numpy_generator(backend, seed)
+
+    if method == C.BULK_RANK:
+        count: int = check_rankable(rule)
+        return unrank_lines(lottery_type, rng.integers(0, count, size=number_of_lines))
+    if method != C.BULK_SAMPLE:
+        raise ValueError(f"Unknown generation method {method}")
+    main = sample_matrix(rule.main_max, rule.main_qty, number_of_lines, rng)
+    if rule.extra_qty:
+        extra = sample_matrix(rule.extra_max, rule.extra_qty, number_of_lines, rng)
+    else:
+        extra = np.empty((number_of_lines, 0), dtype=np.uint8)
+    return BulkLines(main, extra)
+
+
+def batch_matrix(header: store.Header, data) -> BulkLines:
+    """View a batch of packed lines as matrices without copying it
+
+    :param header: the header of the batch
+    :param data: the packed lines, e.g. from store.map_batch
+    :return: the lines as read only matrices over data
+    """
+    matrix = np.frombuffer(data, dtype=np.uint8)
+    matrix = matrix.reshape(header.lines, header.line_width)
+    return BulkLines(matrix[:, :header.main_qty], matrix[:, header.main_qty:])
+
+
+def read_matrix(reader: store.BatchReader) -> BulkLines:
+    """Read the lines of a save file into matrices
+
+    The lines are read C.STORE_COPY_LINES at a time into the matrix, so a
+    file of ranks is never held decoded twice.
+
+    :param reader: the reader of the save file
+    :return: the lines
+    """
+    header = reader.header
+    matrix = np.empty((header.lines, header.line_width), dtype=np.uint8)
+    for start in range(0, header.lines, C.STORE_COPY_LINES):
+        data = reader.get_lines(start, start + C.STORE_COPY_LINES)
+        part = np.frombuffer(data, dtype=np.uint8).reshape(-1, header.line_width)
+        matrix[start:start + len(part)] = part
+    return BulkLines(matrix[:, :header.main_qty], matrix[:, header.main_qty:])
+
+
+def _generate_block(
+    args: Tuple[int, int, Union[np.random.SeedSequence, None], str, str, int]
+) -> BulkLines:
+    """Worker process entry point generating one block of lines
+
+    :param args: lottery_type, number_of_lines, the block's seed, method,
+    backend and the number of lines to keep
+    :return: the generated lines
+    """
+    lottery_type, number_of_lines, seed, method, backend, keep = args
+    lines = generate_bulk(lottery_type, number_of_lines, seed, method, backend)
+    if keep == number_of_lines:
+        return lines
+    return BulkLines(lines.main[:keep].copy(), lines.extra[:keep].copy())
+
+
+def iter_blocks(
+    lottery_type: int,
+    number_of_lines: Union[int, None],
+    seed: Union[int, np.random.SeedSequence, None] = None,
+    workers: Union[int, None] = 1,
+    method: str = C.BULK_SAMPLE,
+    backend: str = C.RNG_BULK_DEFAULT,
+) -> Iterator[BulkLines]:
+    """Generate lines in blocks of C.BULK_BLOCK_LINES, in order
+
+    Each block has its own stream spawned from the root seed, so a fixed
+    seed always gives the same lines whatever the number of workers, and
+    the first lines of a longer run are those of a shorter one.
+    With several workers no more than two blocks per worker are
+    generated ahead of the consumer, so memory use stays bounded.
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param number_of_lines: the number of lines, None for an endless stream
+    :param seed: root seed for a reproducible run, None for a random one
+    :param workers: number of processes, None for one per CPU
+    :param method: C.BULK_SAMPLE or C.BULK_RANK
+    :param backend: the random number generator, one of C.RNG_BACKENDS,
+    the blocks of the unseeded secrets backend have no seed
+    :return: an iterator of the blocks of lines
+    """
+    if number_of_lines is not None and number_of_lines < C.MIN_LINES:
+        raise ValueError(f"At least {C.MIN_LINES} line(s) must be generated")
+    randomness.check_unseeded(backend, seed)
+    unseeded: bool = seed is None or backend == C.RNG_SECRETS
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    def tasks() -> Iterator[tuple]:
+        remaining = number_of_lines
+        while remaining is None or remaining > 0:
+            size: int = C.BULK_BLOCK_LINES
+            if remaining is not None:
+                size = min(size, remaining)
+                remaining -= size
+            # spawning one child at a time gives the same children as
+            # spawning them all at once
+            block_seed = seed.spawn(1)[0]
+            if backend == C.RNG_SECRETS:
+                block_seed = None
+            # the lines of a block depend on its size, so the last block
+            # of a seeded run is generated whole and cut short to give
+            # the same lines as a longer run
+            generated: int = size if unseeded else C.BULK_BLOCK_LINES
+            yield lottery_type, generated, block_seed, method, backend, size
+
+    if workers == 1 or (
+        number_of_lines is not None and number_of_lines <= C.BULK_BLOCK_LINES
+    ):
+        yield from map(_generate_block, tasks())
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Future] = collections.deque()
+        for task in tasks():
+            pending.append(pool.submit(_generate_block, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def generate_parallel(
+    lottery_type: int,
+    number_of_lines: int,
+    seed: Union[int, np.random.SeedSequence, None] = None,
+    workers: Union[int, None] = None,
+    method: str = C.BULK_SAMPLE,
+    backend: str = C.RNG_BULK_DEFAULT,
+) -> BulkLines:
+    """Generate a large batch of lines using several processes
+
+    The lines are generated by iter_blocks, so a fixed seed always gives
+    the same lines whatever the number of workers. To replay a run
+    started without a seed pass a SeedSequence and keep its entropy.
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param number_of_lines: the number of lines to generate
+    :param seed: root seed for a reproducible run, None for a random one
+    :param workers: number of processes, None for one per CPU
+    :param method: C.BULK_SAMPLE or C.BULK_RANK
+    :param backend: the random number generator, one of C.RNG_BACKENDS
+    :return: the generated lines in block order
+    """
+    blocks = list(
+        iter_blocks(lottery_type, number_of_lines, seed, workers, method, backend)
+    )
+    return BulkLines(
+        np.concatenate([block.main for block in blocks]),
+        np.concatenate([block.extra for block in blocks]),
+    )
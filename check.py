@@ -0,0 +1,184 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator check of the saved lines against a draw
+
+The drawn numbers are turned into lookup tables, 1 for a drawn number
+and 0 for any other, so the numbers a line matches are the sum of the
+table entries of its numbers and every batch is scored in one pass over
+its packed lines, a part at a time, vectorized with NumPy if it is
+installed.
+"""
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+import re
+import constants as C
+import rules
+from archive import Archive, BatchInfo
+
+
+class Draw(NamedTuple):
+    """The winning numbers of a draw
+    """
+
+    main: Tuple[int, ...]
+    extra: Tuple[int, ...]
+
+
+class Win(NamedTuple):
+    """A saved line that won a prize
+    """
+
+    batch_id: int
+    # the index of the line in its batch
+    line: int
+    numbers: Tuple[int, ...]
+    main: int
+    extra: int
+
+
+def parse_draw(rule: rules.Rule, text: str) -> Draw:
+    """Read the winning numbers of a draw
+
+    :param rule: the rules of the lottery
+    :param text: the main numbers then the extra numbers, separated by
+    spaces or commas, optionally with a - between the two groups
+    :return: the draw
+    """
+    numbers: List[int] = [int(number) for number in re.findall(r"\d+", text)]
+    if re.search(r"[^\d\s,-]", text) or len(numbers) != rule.line_width:
+        raise ValueError(
+            f"{rule.name}: enter {rule.main_qty} main and "
+            f"{rule.extra_qty} extra numbers, e.g. {rule.format(range(1, 99))}"
+        )
+    draw = Draw(tuple(numbers[:rule.main_qty]), tuple(numbers[rule.main_qty:]))
+    for group, drawn, valid in (
+        ("main", draw.main, rule.main_range),
+        ("extra", draw.extra, rule.extra_range),
+    ):
+        if len(set(drawn)) != len(drawn):
+            raise ValueError(f"{rule.name}: the {group} numbers are repeated")
+        if any(number not in valid for number in drawn):
+            raise ValueError(
+                f"{rule.name}: the {group} numbers must be from "
+                f"{valid.start} to {valid.stop - 1}"
+            )
+    return draw
+
+
+def draw_tables(draw: Draw) -> Tuple[bytes, bytes]:
+    """Return the lookup tables of the drawn main and extra numbers
+
+    :param draw: the winning numbers
+    :return: 256 bytes each, 1 for a drawn number, else 0
+    """
+    main, extra = bytearray(256), bytearray(256)
+    for number in draw.main:
+        main[number] = 1
+    for number in draw.extra:
+        extra[number] = 1
+    return bytes(main), bytes(extra)
+
+
+def match_batch(rule: rules.Rule, data, draw: Draw) -> Iterator[Tuple[int, int, int]]:
+    """Find the lines of a batch that won a prize
+
+    :param rule: the rules of the lottery
+    :param data: bytes like object of the packed lines of the batch
+    :param draw: the winning numbers
+    :return: an iterator of the index, main and extra numbers matched of
+    every winning line
+    """
+    winning = set(rules.prize_tiers(rule))
+    main_table, extra_table = draw_tables(draw)
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    if np is None:
+        data = memoryview(data).cast("B")
+        width: int = rule.line_width
+        main_hits = bytes(data).translate(main_table)
+        extra_hits = bytes(data).translate(extra_table)
+        for index, start in enumerate(range(0, len(data), width)):
+            main = sum(main_hits[start:start + rule.main_qty])
+            extra = sum(extra_hits[start + rule.main_qty:start + width])
+            if (main, extra) in winning:
+                yield index, main, extra
+        return
+
+    matrix = np.frombuffer(data, dtype=np.uint8).reshape(-1, rule.line_width)
+    main_counts = np.frombuffer(main_table, dtype=np.uint8)[
+        matrix[:, :rule.main_qty]
+    ].sum(axis=1)
+    extra_counts = np.frombuffer(extra_table, dtype=np.uint8)[
+        matrix[:, rule.main_qty:]
+    ].sum(axis=1)
+    # only lines matching at least the smallest prize are looked at
+    fewest: int = min(main + extra for main, extra in winning)
+    for index in np.flatnonzero(main_counts + extra_counts >= fewest).tolist():
+        main, extra = int(main_counts[index]), int(extra_counts[index])
+        if (main, extra) in winning:
+            yield index, main, extra
+
+
+def check_archive(
+    archive: Archive, lottery_type: int, draw: Draw
+) -> Tuple[List[BatchInfo], Dict[str, List[Win]]]:
+    """Check every archived batch of a lottery against a draw
+
+    :param archive: the archive of saved batches
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param draw: the winning numbers
+    :return: the batches checked and the winning lines by prize tier
+    name, best tier first
+    """
+    rule = rules.get_rule(lottery_type)
+    wins: Dict[str, List[Win]] = {
+        rules.tier_name(main, extra): [] for main, extra in rules.prize_tiers(rule)
+    }
+    batches: List[BatchInfo] = archive.batches(lottery_type)
+    for info in batches:
+        # a batch is read a part at a time, only the blocks of the part
+        # of a compressed batch are decompressed
+        with archive.reader(info) as reader:
+            for first in range(0, len(reader), C.STORE_COPY_LINES):
+                data = reader.get_lines(first, first + C.STORE_COPY_LINES)
+                for index, main, extra in match_batch(rule, data, draw):
+                    start: int = index * rule.line_width
+                    numbers = tuple(data[start:start + rule.line_width])
+                    wins[rules.tier_name(main, extra)].append(
+                        Win(info.batch_id, first + index, numbers, main, extra)
+                    )
+    return batches, wins
+
+
+def report(
+    rule: rules.Rule, draw: Draw, batches: List[BatchInfo], wins: Dict[str, List[Win]]
+) -> str:
+    """Return the winning lines as text
+
+    :param rule: the rules of the lottery
+    :param draw: the winning numbers
+    :param batches: the batches checked
+    :param wins: the winning lines by prize tier name
+    :return: str one line of text per prize tier and winning line
+    """
+    lines: List[str] = [
+        f"{rule.name} draw {rule.format(draw.main + draw.extra)}",
+        f"{len(batches)} saved batches, "
+        f"{sum(info.lines for info in batches):,} lines checked",
+    ]
+    for tier, tier_wins in wins.items():
+        if not tier_wins:
+            continue
+        lines.append(f"Match {tier}: {len(tier_wins):,} lines")
+        lines.extend(
+            f"    batch {win.batch_id} line {win.line + 1}: {rule.format(win.numbers)}"
+            for win in tier_wins[:C.CHECK_REPORT_LINES]
+        )
+        if len(tier_wins) > C.CHECK_REPORT_LINES:
+            lines.append(f"    and {len(tier_wins) - C.CHECK_REPORT_LINES:,} more")
+    if not any(wins.values()):
+        lines.append("No winning lines")
+    return "\n".join(lines)
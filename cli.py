@@ -0,0 +1,646 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator command line interface, without wxPython
+"""
+from datetime import datetime
+from typing import Iterator, List, TextIO, Union
+import argparse
+import contextlib
+import json
+import sys
+import time
+import check
+import constants as C
+import dedup
+import engine
+import export
+import rules
+from archive import Archive, BatchInfo
+from common import ResultsData, open_results
+
+OUTPUT_FORMATS: List[str] = ["text", "csv", "json"]
+
+
+def parse_date(text: str) -> float:
+    """Convert an ISO date or date and time to time.time() seconds
+
+    :param text: str e.g. 2019-12-31 or 2019-12-31T20:00
+    :return: the time in seconds since the epoch
+    """
+    return datetime.fromisoformat(text).timestamp()
+
+
+def generate_chunks(
+    lottery_type: int,
+    number_of_lines: int,
+    seed,
+    workers,
+    seen=None,
+    method: Union[str, None] = None,
+    backend: Union[str, None] = None,
+) -> Iterator:
+    """Generate a stream of chunks of packed lines
+
+    The NumPy bulk generator is used whenever NumPy is available, so a
+    seed gives the same lines whatever the number of lines or workers.
+    Unique lines, or any lines without NumPy, use the engine.
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param number_of_lines: the number of lines to generate
+    :param seed: seed for a reproducible run, None for a random one
+    :param workers: number of processes for bulk generation, None for auto
+    :param seen: dedup.RankSet of the lines not to generate, None for any
+    :param method: one of C.BULK_METHODS, None for auto
+    :param backend: one of C.RNG_BACKENDS, None for the default of the
+    generator used
+    :return: an iterator of bytes like chunks
+    """
+    bulk = None
+    if seen is None:
+        try:
+            import bulk
+        except ImportError:
+            if workers is not None or method is not None:
+                raise ValueError("Bulk generation requires NumPy") from None
+    if bulk is None:
+        return engine.generate_chunks(
+            lottery_type,
+            number_of_lines,
+            seed,
+            seen=seen,
+            backend=backend or C.RNG_ENGINE_DEFAULT,
+        )
+    blocks = bulk.iter_blocks(
+        lottery_type,
+        number_of_lines,
+        seed,
+        workers,
+        method or C.BULK_SAMPLE,
+        backend or C.RNG_BULK_DEFAULT,
+    )
+    return (block.packed() for block in blocks)
+
+
+def generate(
+    lottery_type: int,
+    number_of_lines: int,
+    seed,
+    workers,
+    method: Union[str, None] = None,
+    backend: Union[str, None] = None,
+) -> ResultsData:
+    """Generate a batch of lines in memory
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param number_of_lines: the number of lines to generate
+    :param seed: seed for a reproducible run, None for a random one
+    :param workers: number of processes for bulk generation, None for auto
+    :param method: one of C.BULK_METHODS, None for auto
+    :param backend: one of C.RNG_BACKENDS, None for the default
+    :return: the generated results
+    """
+    chunks = generate_chunks(
+        lottery_type, number_of_lines, seed, workers, method=method, backend=backend
+    )
+    result = ResultsData(lottery_type)
+    result.set_buffer(b"".join(chunks))
+    return result
+
+
+def write_results(
+    results: ResultsData, out: TextIO, output_format: str, heading: bool = True
+) -> None:
+    """Write the lines of a batch to a text stream
+
+    :param results: the lines to write
+    :param out: the stream to write to
+    :param output_format: one of OUTPUT_FORMATS
+    :param heading: False to leave out the csv heading, when writing
+    a batch in several parts
+    :return: None
+    """
+    if output_format == "csv" and heading:
+        columns = [f"main_{n + 1}" for n in range(results.main_qty)]
+        columns += [f"extra_{n + 1}" for n in range(results.extra_qty)]
+        out.write(",".join(columns) + "\n")
+    width: int = results.line_width
+    main_qty: int = results.main_qty
+    # the lines are read a range at a time, a saved batch of ranks is
+    # decoded a range rather than a line at a time
+    for first in range(0, results.get_data_length(), C.CLI_WRITE_LINES):
+        data = results.get_lines(first, first + C.CLI_WRITE_LINES)
+        rows: List[str] = []
+        for start in range(0, len(data), width):
+            line = engine.Line(
+                tuple(data[start:start + main_qty]),
+                tuple(data[start + main_qty:start + width]),
+            )
+            if output_format == "csv":
+                rows.append(",".join(map(str, line.main + line.extra)))
+            elif output_format == "json":
+                rows.append(json.dumps({"main": line.main, "extra": line.extra}))
+            else:
+                rows.append(engine.format_line(line))
+        if rows:
+            out.write("\n".join(rows) + "\n")
+
+
+@contextlib.contextmanager
+def open_output(file_name: Union[str, None]):
+    """Open the output file or use stdout
+
+    :param file_name: the file to write or None for stdout
+    :return: a context manager giving a text stream
+    """
+    if file_name is None:
+        yield sys.stdout
+    else:
+        with open(file_name, "w", newline="") as out:
+            yield out
+
+
+def select_batch(archive: Archive, args) -> Union[BatchInfo, None]:
+    """Find the batch chosen by the --batch or --date arguments
+
+    :param archive: the archive to search
+    :param args: the parsed command line arguments
+    :return: the batch or None if there is none
+    """
+    if args.batch is not None:
+        return archive.get(args.batch)
+    if args.date is not None:
+        return archive.find(args.type, parse_date(args.date))
+    return archive.latest(args.type)
+
+
+def storage(args) -> dict:
+    """Return the encoding of saved batches chosen by the --ranked and
+    --compress arguments
+
+    :param args: the parsed command line arguments
+    :return: the encoding and codec keyword arguments of Archive.add
+    """
+    if args.compress:
+        return {"encoding": C.STORE_BLOCKED, "codec": C.STORE_CODECS[args.compress]}
+    return {"encoding": args.encoding}
+
+
+def command_generate(args) -> int:
+    """Generate lines, optionally saving them to the archive"""
+    seen = None
+    if args.unique:
+        # no line of this batch or of any archived batch is repeated
+        with Archive(args.archive) as archive:
+            seen = dedup.history(archive, args.type)
+    chunks = generate_chunks(
+        args.type, args.lines, args.seed, args.workers, seen, args.method, args.rng
+    )
+    with open_output(args.output) as out:
+
+        def write_chunks() -> Iterator:
+            # write each chunk as it passes on to the archive
+            for number, chunk in enumerate(engine.prefetch(chunks)):
+                results = ResultsData(args.type)
+                results.set_buffer(chunk)
+                write_results(results, out, args.format, heading=number == 0)
+                yield chunk
+
+        if args.save:
+            with Archive(args.archive) as archive:
+                info = archive.add_stream(args.type, write_chunks(), **storage(args))
+            print(f"Saved batch {info.batch_id}", file=sys.stderr)
+        else:
+            for _ in write_chunks():
+                pass
+    return 0
+
+
+def command_wheel(args) -> int:
+    """Generate a wheel covering a pool of numbers"""
+    # NumPy is only needed for wheels
+    import wheel
+
+    try:
+        lines = wheel.generate_wheel(
+            args.type, args.pool, args.match, args.condition, args.seed
+        )
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 2
+    results = ResultsData(args.type)
+    results.set_buffer(lines.packed().tobytes())
+    with open_output(args.output) as out:
+        write_results(results, out, args.format)
+    print(f"{len(lines)} lines", file=sys.stderr)
+    if args.save:
+        with Archive(args.archive) as archive:
+            info = archive.add(args.type, results.get_buffer())
+        print(f"Saved batch {info.batch_id}", file=sys.stderr)
+    return 0
+
+
+def command_check(args) -> int:
+    """Check every archived batch against the winning numbers of a draw"""
+    rule = rules.get_rule(args.type)
+    try:
+        draw = check.parse_draw(rule, " ".join(args.numbers))
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 2
+    with Archive(args.archive) as archive:
+        batches, wins = check.check_archive(archive, args.type, draw)
+    if not batches:
+        print(f"No saved {rule.name} numbers were found", file=sys.stderr)
+        return 1
+    with open_output(args.output) as out:
+        if args.format == "json":
+            json.dump(
+                {
+                    "lottery": rule.name,
+                    "draw": list(draw.main + draw.extra),
+                    "batches": len(batches),
+                    "wins": {
+                        tier: [
+                            {
+                                "batch": win.batch_id,
+                                "line": win.line + 1,
+                                "numbers": list(win.numbers),
+                            }
+                            for win in tier_wins
+                        ]
+                        for tier, tier_wins in wins.items()
+                    },
+                },
+                out,
+                indent=2,
+            )
+            out.write("\n")
+        else:
+            out.write(check.report(rule, draw, batches, wins) + "\n")
+    return 0
+
+
+def command_simulate(args) -> int:
+    """Match an archived batch against simulated draws"""
+    # NumPy is only needed for simulations
+    import bulk
+    import simulate
+
+    with Archive(args.archive) as archive:
+        info = select_batch(archive, args)
+        if info is None:
+            print(f"No saved {rules.get_rule(args.type).name} numbers were found",
+                  file=sys.stderr)
+            return 1
+        # packed lines are memory mapped, ranks are decoded a part at a
+        # time into the matrix
+        data = None
+        with archive.reader(info) as reader:
+            header = reader.header
+            if header.encoding != C.STORE_PACKED:
+                lines = bulk.read_matrix(reader)
+        if header.encoding == C.STORE_PACKED:
+            header, data = archive.open(info)
+            lines = bulk.batch_matrix(header, data)
+        result = simulate.simulate(
+            header.lottery_type, lines, args.draws, args.seed, args.workers
+        )
+        del lines, data
+    pairs: int = header.lines * args.draws
+    tiers = result.tiers()
+    with open_output(args.output) as out:
+        if args.format == "json":
+            json.dump(
+                {
+                    "lottery": header.lottery_type_name,
+                    "batch": info.batch_id,
+                    "lines": header.lines,
+                    "draws": args.draws,
+                    "tiers": tiers,
+                    "winning_lines_per_draw": sum(tiers.values()) / args.draws,
+                },
+                out,
+                indent=2,
+            )
+            out.write("\n")
+            return 0
+        out.write(
+            f"{header.lottery_type_name} batch {info.batch_id}: "
+            f"{header.lines:,} lines, {args.draws:,} draws\n"
+        )
+        for tier, wins in tiers.items():
+            odds = f"1 in {pairs / wins:,.0f}" if wins else "-"
+            out.write(f"{tier:<6}{wins:>16,}{odds:>20}\n")
+        out.write(
+            f"winning lines per draw {sum(tiers.values()) / args.draws:.4f}\n"
+        )
+    return 0
+
+
+def command_show(args) -> int:
+    """List archived batches or show the lines of one of them"""
+    with Archive(args.archive) as archive:
+        if args.list:
+            start = parse_date(args.since) if args.since else float("-inf")
+            end = parse_date(args.until) if args.until else float("inf")
+            for info in archive.batches(args.type, start, end):
+                saved = time.strftime(C.DATE_FORMAT, time.localtime(info.date))
+                print(f"{info.batch_id}\t{info.lines}\t{saved}")
+            return 0
+        info = select_batch(archive, args)
+        if info is None:
+            print(f"No saved {rules.get_rule(args.type).name} numbers were found",
+                  file=sys.stderr)
+            return 1
+        results = open_results(archive, info)
+        print(f"Saved on {results.stored_date}", file=sys.stderr)
+        with open_output(args.output) as out:
+            write_results(results, out, args.format)
+    return 0
+
+
+def command_export(args) -> int:
+    """Export the lines of an archived batch for analysis"""
+    with Archive(args.archive) as archive:
+        info = select_batch(archive, args)
+        if info is None:
+            print(f"No saved {rules.get_rule(args.type).name} numbers were found",
+                  file=sys.stderr)
+            return 1
+        # the batch is read a chunk at a time, only the blocks of the
+        # chunk of a compressed batch are decompressed
+        with archive.reader(info) as reader:
+            header = reader.header
+            description = {"batch": info.batch_id, "date": header.date}
+            try:
+                lines = export.export_batch(
+                    header.lottery_type, reader, args.output, args.format, description
+                )
+            except ValueError as error:
+                print(error, file=sys.stderr)
+                return 2
+    print(f"Exported {lines:,} lines to {args.output}", file=sys.stderr)
+    return 0
+
+
+def command_delete(args) -> int:
+    """Delete an archived batch"""
+    with Archive(args.archive) as archive:
+        info = select_batch(archive, args)
+        if info is None:
+            print(f"No saved {rules.get_rule(args.type).name} numbers were found",
+                  file=sys.stderr)
+            return 1
+        archive.delete(info)
+    print(f"Deleted batch {info.batch_id}", file=sys.stderr)
+    return 0
+
+
+def command_compact(args) -> int:
+    """Compress archived batches"""
+    start = parse_date(args.since) if args.since else float("-inf")
+    end = parse_date(args.until) if args.until else float("inf")
+    before: int = 0
+    after: int = 0
+    with Archive(args.archive) as archive:
+        batches = archive.batches(args.type, start, end)
+        for info in batches:
+            old, new = archive.recode(
+                info, C.STORE_BLOCKED, C.STORE_CODECS[args.compress]
+            )
+            before += old
+            after += new
+    print(
+        f"Compacted {len(batches)} batch(es) from {before:,} to {after:,} bytes",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def command_serve(args) -> int:
+    """Run the local generation service"""
+    import asyncio
+    import logging
+    import service
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        asyncio.run(service.serve(args.archive, args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def command_benchmark(args) -> int:
+    """Time generating, saving and loading a batch"""
+    timings = {}
+    start = time.perf_counter()
+    results = generate(
+        args.type, args.lines, args.seed, args.workers, args.method, args.rng
+    )
+    timings["generate"] = time.perf_counter() - start
+    with Archive(args.archive) as archive:
+        start = time.perf_counter()
+        info = archive.add(args.type, results.get_buffer(), **storage(args))
+        timings["save"] = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = open_results(archive, info)
+        bytes(loaded.get_buffer())
+        timings["load"] = time.perf_counter() - start
+        # release the memory mapped file before deleting it
+        del loaded
+        archive.delete(info)
+    for stage, seconds in timings.items():
+        rate = args.lines / seconds if seconds else float("inf")
+        print(f"{stage:<10}{seconds * 1000:12.3f} ms{rate:16,.0f} lines/s")
+    return 0
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """Create the command line parser
+
+    :return: the parser
+    """
+
+    def lottery_type(text: str) -> int:
+        try:
+            return rules.find_rule(text).rule_id
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f"choose from {', '.join(rules.names())}"
+            ) from None
+
+    parser = argparse.ArgumentParser(
+        prog="lottery_generator.py", description=f"{C.PROGRAM} {C.VERSION}"
+    )
+    parser.add_argument(
+        "--archive", default=C.ARCHIVE_DIR, help="directory of the saved batches"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "-t",
+        "--type",
+        type=lottery_type,
+        default=C.LOTTERY_DEFAULT,
+        help=f"the lottery, default {rules.get_rule(C.LOTTERY_DEFAULT).name}",
+    )
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="text")
+    output.add_argument("-o", "--output", help="the file to write, default stdout")
+    select = argparse.ArgumentParser(add_help=False)
+    select.add_argument("--batch", type=int, help="the id of a saved batch")
+    select.add_argument("--date", help="the batch saved at or last before a date")
+    lines = argparse.ArgumentParser(add_help=False)
+    lines.add_argument(
+        "-n", "--lines", type=int, default=C.DEFAULT_LINES, help="number of lines"
+    )
+    lines.add_argument("--seed", type=int, help="seed for a reproducible run")
+    lines.add_argument(
+        "--workers", type=int, help="number of processes for bulk generation"
+    )
+    lines.add_argument(
+        "--method",
+        choices=C.BULK_METHODS,
+        help="bulk generation by sampling numbers or drawing line ranks",
+    )
+    lines.add_argument(
+        "--rng",
+        choices=C.RNG_BACKENDS,
+        help=f"random number generator, default {C.RNG_BULK_DEFAULT}, "
+        f"{C.RNG_ENGINE_DEFAULT} for unique lines or without NumPy; "
+        f"{C.RNG_SECRETS} can not be seeded",
+    )
+    lines.add_argument(
+        "--ranked",
+        dest="encoding",
+        action="store_const",
+        const=C.STORE_RANKED,
+        default=C.STORE_PACKED,
+        help="save each line as its rank, 3 or 4 bytes",
+    )
+    lines.add_argument(
+        "--compress",
+        choices=C.STORE_CODECS,
+        help="save the ranks in compressed blocks",
+    )
+
+    sub = commands.add_parser(
+        "generate", parents=[common, lines, output], help=command_generate.__doc__
+    )
+    sub.add_argument("--save", action="store_true", help="save to the archive")
+    sub.add_argument(
+        "--unique",
+        action="store_true",
+        help="no line repeated in the batch or any archived batch",
+    )
+    sub.set_defaults(handler=command_generate)
+
+    sub = commands.add_parser(
+        "wheel", parents=[common, output], help=command_wheel.__doc__
+    )
+    sub.add_argument(
+        "pool", type=int, nargs="+", help="the main numbers to cover"
+    )
+    sub.add_argument(
+        "-m", "--match", type=int, default=3, help="numbers matched by a line"
+    )
+    sub.add_argument(
+        "--if",
+        dest="condition",
+        type=int,
+        help="if this many drawn numbers are in the pool, default --match",
+    )
+    sub.add_argument("--seed", type=int, help="seed for a reproducible run")
+    sub.add_argument("--save", action="store_true", help="save to the archive")
+    sub.set_defaults(handler=command_wheel)
+
+    sub = commands.add_parser(
+        "show", parents=[common, select, output], help=command_show.__doc__
+    )
+    sub.add_argument("--list", action="store_true", help="list the saved batches")
+    sub.add_argument("--since", help="list batches saved from this date")
+    sub.add_argument("--until", help="list batches saved up to this date")
+    sub.set_defaults(handler=command_show)
+
+    sub = commands.add_parser(
+        "check", parents=[common, output], help=command_check.__doc__
+    )
+    sub.add_argument(
+        "numbers", nargs="+", help="the main then the extra winning numbers"
+    )
+    sub.set_defaults(handler=command_check)
+
+    sub = commands.add_parser(
+        "simulate", parents=[common, select, output], help=command_simulate.__doc__
+    )
+    sub.add_argument(
+        "-d", "--draws", type=int, default=C.SIMULATE_DRAWS, help="draws to simulate"
+    )
+    sub.add_argument("--seed", type=int, help="seed for a reproducible run")
+    sub.add_argument(
+        "--workers", type=int, default=None, help="number of processes, default all"
+    )
+    sub.set_defaults(handler=command_simulate)
+
+    sub = commands.add_parser(
+        "export", parents=[common, select], help=command_export.__doc__
+    )
+    sub.add_argument("-f", "--format", choices=C.EXPORT_FORMATS, default="csv")
+    sub.add_argument("-o", "--output", required=True, help="the file to write")
+    sub.set_defaults(handler=command_export)
+
+    sub = commands.add_parser(
+        "delete", parents=[common, select], help=command_delete.__doc__
+    )
+    sub.set_defaults(handler=command_delete)
+
+    sub = commands.add_parser(
+        "compact", parents=[common], help=command_compact.__doc__
+    )
+    sub.add_argument("--since", help="compress batches saved from this date")
+    sub.add_argument("--until", help="compress batches saved up to this date")
+    sub.add_argument(
+        "--compress", choices=C.STORE_CODECS, default="zlib", help="the compression"
+    )
+    sub.set_defaults(handler=command_compact)
+
+    sub = commands.add_parser("serve", help=command_serve.__doc__)
+    sub.add_argument("--host", default=C.SERVICE_HOST, help="the address to listen on")
+    sub.add_argument("--port", type=int, default=C.SERVICE_PORT, help="the TCP port")
+    sub.add_argument("--socket", help="listen on this Unix socket instead of a port")
+    sub.set_defaults(handler=command_serve)
+
+    sub = commands.add_parser(
+        "benchmark", parents=[common, lines], help=command_benchmark.__doc__
+    )
+    sub.set_defaults(handler=command_benchmark)
+    return parser
+
+
+def main(argv: Union[List[str], None] = None) -> int:
+    """Command line main
+
+    :param argv: the command line arguments, None for sys.argv
+    :return: int the exit status
+    """
+    args = make_parser().parse_args(argv)
+    if getattr(args, "lines", C.MIN_LINES) < C.MIN_LINES:
+        print(f"At least {C.MIN_LINES} line(s) must be generated", file=sys.stderr)
+        return 2
+    if getattr(args, "rng", None) == C.RNG_SECRETS and args.seed is not None:
+        print(f"The {C.RNG_SECRETS} generator can not be seeded", file=sys.stderr)
+        return 2
+    try:
+        return args.handler(args)
+    except BrokenPipeError:
+        # the reader of stdout, e.g. head, has stopped reading
+        sys.stderr.close()
+        return 0
+    except ValueError as error:
+        # bad input, e.g. a date that can not be parsed
+        print(error, file=sys.stderr)
+        return 2
@@ -0,0 +1,173 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator combinatorial ranking of lines
+
+A group of k sorted numbers is ranked in colexicographic order, the rank
+of numbers c_1 < ... < c_k counted from 0 being the sum of C(c_i, i).
+The rank of a line combines the ranks of its main and extra numbers,
+giving each possible line of a lottery a unique integer below
+line_count(rule). unrank_line is the inverse, so drawing a uniform rank
+draws a uniform line, and a rank stored in rank_width(rule) bytes is a
+compact encoding of a line, e.g. 4 bytes rather than 7 for EUROMILLIONS.
+"""
+from math import comb
+from typing import List, Sequence, Tuple
+import bisect
+import functools
+import constants as C
+from rules import Rule
+
+
+@functools.lru_cache(maxsize=None)
+def comb_table(population: int, quantity: int) -> Tuple[Tuple[int, ...], ...]:
+    """Return C(value, position + 1) for every position and value
+
+    :param population: the number of values to choose from
+    :param quantity: the number of values in a group
+    :return: table[position][value]
+    """
+    return tuple(
+        tuple(comb(value, position + 1) for value in range(population))
+        for position in range(quantity)
+    )
+
+
+def group_count(maximum: int, quantity: int) -> int:
+    """Return the number of possible groups of numbers
+
+    :param maximum: the highest number plus 1
+    :param quantity: the number of numbers in a group, 0 for none
+    :return: int the number of groups
+    """
+    return comb(maximum - C.RULE_START, quantity) if quantity else 1
+
+
+def line_count(rule: Rule) -> int:
+    """Return the number of possible lines of a lottery
+
+    :param rule: the rules of the lottery
+    :return: int the number of lines
+    """
+    return group_count(rule.main_max, rule.main_qty) * group_count(
+        rule.extra_max, rule.extra_qty
+    )
+
+
+def rank_width(rule: Rule) -> int:
+    """Return the number of bytes needed to store the rank of a line
+
+    :param rule: the rules of the lottery
+    :return: int the number of bytes
+    """
+    return max(1, -(-(line_count(rule) - 1).bit_length() // 8))
+
+
+def rank_group(numbers: Sequence[int], maximum: int) -> int:
+    """Return the colex rank of a sorted group of numbers
+
+    :param numbers: the sorted numbers
+    :param maximum: the highest number plus 1
+    :return: int the rank
+    """
+    table = comb_table(maximum - C.RULE_START, len(numbers))
+    return sum(
+        table[position][number - C.RULE_START]
+        for position, number in enumerate(numbers)
+    )
+
+
+def rank_line(rule: Rule, numbers: Sequence[int]) -> int:
+    """Return the rank of a line
+
+    :param rule: the rules of the lottery
+    :param numbers: the main numbers followed by the extra numbers
+    :return: int the rank, below line_count(rule)
+    """
+    rank = rank_group(numbers[:rule.main_qty], rule.main_max)
+    if rule.extra_qty:
+        rank *= group_count(rule.extra_max, rule.extra_qty)
+        rank += rank_group(numbers[rule.main_qty:rule.line_width], rule.extra_max)
+    return rank
+
+
+def unrank_group(rank: int, quantity: int, maximum: int) -> List[int]:
+    """Return the sorted group of numbers of a colex rank
+
+    :param rank: the rank, below group_count(maximum, quantity)
+    :param quantity: the number of numbers in the group
+    :param maximum: the highest number plus 1
+    :return: the sorted numbers
+    """
+    table = comb_table(maximum - C.RULE_START, quantity)
+    numbers: List[int] = [0] * quantity
+    for position in range(quantity - 1, -1, -1):
+        # the largest value whose combination count does not exceed rank
+        value = bisect.bisect_right(table[position], rank) - 1
+        rank -= table[position][value]
+        numbers[position] = value + C.RULE_START
+    return numbers
+
+
+def unrank_line(rule: Rule, rank: int) -> List[int]:
+    """Return the line of a rank
+
+    :param rule: the rules of the lottery
+    :param rank: the rank, below line_count(rule)
+    :return: the main numbers followed by the extra numbers
+    """
+    if not 0 <= rank < line_count(rule):
+        raise ValueError(f"{rule.name}: no line has the rank {rank}")
+    if not rule.extra_qty:
+        return unrank_group(rank, rule.main_qty, rule.main_max)
+    rank, extra = divmod(rank, group_count(rule.extra_max, rule.extra_qty))
+    return unrank_group(rank, rule.main_qty, rule.main_max) + unrank_group(
+        extra, rule.extra_qty, rule.extra_max
+    )
+
+
+def rank_buffer(rule: Rule, buffer) -> List[int]:
+    """Return the ranks of the lines of a buffer of packed lines
+
+    :param rule: the rules of the lottery
+    :param buffer: bytes like object of packed lines
+    :return: the rank of every line
+    """
+    data = memoryview(buffer).cast("B")
+    width: int = rule.line_width
+    return [
+        rank_line(rule, data[start:start + width])
+        for start in range(0, len(data), width)
+    ]
+
+
+def encode_ranks(rule: Rule, buffer) -> bytes:
+    """Encode packed lines as their ranks
+
+    :param rule: the rules of the lottery
+    :param buffer: bytes like object of packed lines
+    :return: the little endian ranks, rank_width(rule) bytes per line
+    """
+    width: int = rank_width(rule)
+    return b"".join(
+        rank.to_bytes(width, "little") for rank in rank_buffer(rule, buffer)
+    )
+
+
+def decode_ranks(rule: Rule, buffer) -> bytes:
+    """Decode lines encoded by encode_ranks
+
+    :param rule: the rules of the lottery
+    :param buffer: bytes like object of the encoded ranks
+    :return: the packed lines
+    """
+    data = memoryview(buffer).cast("B")
+    width: int = rank_width(rule)
+    return bytes(
+        number
+        for start in range(0, len(data), width)
+        for number in unrank_line(
+            rule, int.from_bytes(data[start:start + width], "little")
+        )
+    )
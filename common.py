@@ -5,8 +5,15 @@
 """Lottery generator common classes using wxPython
 """
 import dataclasses
-from typing import Union
+from typing import TYPE_CHECKING, Union
+import time
 import constants as C
+import engine
+import rules
+
+if TYPE_CHECKING:
+    from archive import Archive, BatchInfo
+    from store import BatchReader
 
 
 @dataclasses.dataclass
@@ -17,13 +24,15 @@ class OptionsData:
     lottery_type: int = C.LOTTERY_DEFAULT
     number_of_lines: int = 2
     option: int = C.OPTIONS_DEFAULT
+    # True to never repeat a line of the batch or of any saved batch
+    unique: bool = False
 
     def get_lottery_name(self):
         """Return a text of the type of lottery to generate numbers for
 
         :return: str the text of the selected lottery type
         """
-        return C.LOTTERY_CHOICES[self.lottery_type]
+        return rules.get_rule(self.lottery_type).name
 
     def get_option_name(self):
         """Return a text value of action to be performed
@@ -33,61 +42,230 @@ class OptionsData:
         return C.OPTIONS_CHOICES[self.option]
 
 
-@dataclasses.dataclass
 class ResultsData:
     """Data to be passed to the results display frame
+
+    The numbers of all lines are held in one contiguous buffer of bytes,
+    each line being the main numbers followed by the extra numbers.
+    A line is only formatted as text when it is displayed or exported.
+    The lines of a saved batch of ranks are instead read from a
+    store.BatchReader as they are displayed.
     """
 
-    saved: bool = False
-    # generated is True if generated or
-    # False if retrieved from file
-    generated: bool = True
-    number_of_lines: int = 0
-    stored_date: str = None
-    lottery_type_name: str = ""
-    data = []
-
-    @classmethod
-    def clear_data(cls) -> None:
+    __slots__ = (
+        "saved",
+        "generated",
+        "stored_date",
+        "rule",
+        "_buffer",
+        "_reader",
+    )
+
+    def __init__(
+        self,
+        lottery_type: int,
+        saved: bool = False,
+        generated: bool = True,
+        stored_date: str = None,
+    ) -> None:
+        self.saved: bool = saved
+        # generated is True if generated or
+        # False if retrieved from file
+        self.generated: bool = generated
+        self.stored_date: str = stored_date
+        self.rule: rules.Rule = rules.get_rule(lottery_type)
+        self._buffer: Union[bytearray, memoryview] = bytearray()
+        self._reader: Union["BatchReader", None] = None
+
+    @property
+    def lottery_type_name(self) -> str:
+        """Return the name of the lottery of the results
+
+        :return: str the name of the lottery
+        """
+        return self.rule.name
+
+    @property
+    def main_qty(self) -> int:
+        """Return the quantity of main numbers in each line
+
+        :return: int the quantity of main numbers
+        """
+        return self.rule.main_qty
+
+    @property
+    def extra_qty(self) -> int:
+        """Return the quantity of extra numbers in each line
+
+        :return: int the quantity of extra numbers
+        """
+        return self.rule.extra_qty
+
+    @property
+    def line_width(self) -> int:
+        """Return the number of bytes used by each line
+
+        :return: int the quantity of main and extra numbers
+        """
+        return self.rule.line_width
+
+    @property
+    def number_of_lines(self) -> int:
+        """Return the number of results
+
+        :return: the number of results in memory
+        """
+        if self._reader is not None:
+            return len(self._reader)
+        return len(self._buffer) // self.line_width
+
+    def clear_data(self) -> None:
         """Remove all data items
 
         :return: None
         """
-        del cls.data[: cls.get_data_length()]
+        self._buffer = bytearray()
+        self._reader = None
 
-    @classmethod
-    def is_retrieved(cls) -> bool:
+    def is_retrieved(self) -> bool:
         """Does the data come from a file
 
         :return: bool True if the data was returned from a saved file
         """
-        return not cls.generated
+        return not self.generated
 
-    @classmethod
-    def get_data_length(cls) -> int:
+    def get_data_length(self) -> int:
         """Return the number of results
 
         :return: the number of results in memory
         """
-        return len(cls.data)
+        return self.number_of_lines
+
+    def get_line(self, item: int) -> Union[engine.Line, None]:
+        """Return the numbers of a line
+
+        :param item: the index of the required line
+        :return: the line if valid data is held or None if not
+        """
+        if item < 0 or item >= self.number_of_lines:
+            return None
+        numbers = self._line_numbers(item)
+        return engine.Line(
+            tuple(numbers[:self.main_qty]), tuple(numbers[self.main_qty:])
+        )
 
-    @classmethod
-    def get_data_item(cls, item: int) -> Union[str, None]:
-        """Return a item of data
+    def get_data_item(self, item: int) -> Union[str, None]:
+        """Return a item of data formatted for display
 
         :param item: the index of the required data
         :return: a string if valid data is held or None if not
         """
-        if item < 0 or item > len(cls.data):
+        if item < 0 or item >= self.number_of_lines:
             return None
-        return cls.data[item]
+        return self.rule.format(self._line_numbers(item))
 
-    @classmethod
-    def set_data_item(cls, result: str) -> None:
-        """Add a dat item to the list of results
+    def get_lines(self, start: int, stop: int):
+        """Return the packed numbers of a range of lines
 
-        :param result: the data to append to the list of results
+        :param start: the index of the first line
+        :param stop: the index after the last line
+        :return: bytes like object of the packed lines
+        """
+        if self._reader is not None:
+            return self._reader.get_lines(start, stop)
+        start, stop, _ = slice(start, stop).indices(self.number_of_lines)
+        return self._buffer[start * self.line_width:max(start, stop) * self.line_width]
+
+    def _line_numbers(self, item: int):
+        """Return the packed numbers of a valid line
+
+        :param item: the index of the line
+        :return: bytes like object of the numbers of the line
+        """
+        if self._reader is not None:
+            return self._reader.get_line(item)
+        start: int = item * self.line_width
+        return self._buffer[start:start + self.line_width]
+
+    def set_data_item(self, line: engine.Line) -> None:
+        """Add a line to the results
+
+        :param line: the line to append to the results
+        :return: None
+        """
+        if line is not None:
+            self._buffer.extend(line.main)
+            self._buffer.extend(line.extra)
+
+    def append_buffer(self, buffer) -> None:
+        """Add a chunk of packed lines to the results
+
+        :param buffer: bytes like object of whole packed lines
+        :return: None
+        """
+        view = memoryview(buffer).cast("B")
+        if len(view) % self.line_width:
+            raise ValueError("The buffer does not hold a whole number of lines")
+        if self._reader is not None or not isinstance(self._buffer, bytearray):
+            self._buffer = bytearray(self.get_buffer())
+            self._reader = None
+        self._buffer.extend(view)
+
+    def get_buffer(self) -> memoryview:
+        """Return the raw numbers of all lines
+
+        :return: a read only view of the buffer, the lines of a reader
+        are all read into memory
+        """
+        if self._reader is not None:
+            return memoryview(self._reader.get_lines(0, len(self._reader)))
+        return memoryview(self._buffer).toreadonly()
+
+    def set_buffer(self, buffer) -> None:
+        """Use a buffer of numbers as the results, without copying it
+
+        :param buffer: any contiguous bytes like object, e.g. a uint8
+        NumPy matrix of the main numbers followed by the extra numbers
         :return: None
         """
-        if result is not None:
-            cls.data.append(result)
+        view = memoryview(buffer).cast("B")
+        if len(view) % self.line_width:
+            raise ValueError("The buffer does not hold a whole number of lines")
+        self._buffer = view
+        self._reader = None
+
+    def set_reader(self, reader: "BatchReader") -> None:
+        """Use the lines of a save file as the results, reading each line
+        only when it is asked for
+
+        :param reader: the reader of the save file
+        :return: None
+        """
+        self._buffer = bytearray()
+        self._reader = reader
+
+
+def open_results(archive: "Archive", info: "BatchInfo") -> ResultsData:
+    """Return the lines of an archived batch without reading them
+
+    A batch of packed lines is memory mapped, the lines of a batch of
+    ranks are decoded, and decompressed, only when they are displayed.
+
+    :param archive: the archive holding the batch
+    :param info: the batch
+    :return: the results over the batch
+    """
+    reader = archive.reader(info)
+    header = reader.header
+    result = ResultsData(
+        header.lottery_type,
+        generated=False,
+        stored_date=time.strftime(C.DATE_FORMAT, time.localtime(header.date)),
+    )
+    if header.encoding == C.STORE_PACKED:
+        reader.close()
+        _, data = archive.open(info)
+        result.set_buffer(data)
+    else:
+        result.set_reader(reader)
+    return result
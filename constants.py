@@ -6,6 +6,7 @@
 """
 from pathlib import Path
 from typing import Dict, List
+import os
 
 VERSION: str = "0.0.1"
 AUTHOR: str = "Bernd U. Wiesner"
@@ -22,7 +23,7 @@ LOTTERY_CHOICES: List[str] = [
 LOTTERY_DICT: Dict[int, str] = {k: v for k, v in enumerate(LOTTERY_CHOICES)}
 LOTTERY_DEFAULT: int = 1
 
-OPTIONS_CHOICES: List[str] = ["Save", "No Save", "Show", "Delete"]
+OPTIONS_CHOICES: List[str] = ["Save", "No Save", "Show", "Delete", "Check"]
 OPTIONS_DICT: Dict[int, str] = {k: v for k, v in enumerate(OPTIONS_CHOICES)}
 OPTIONS_DEFAULT = 1
 
@@ -42,17 +43,68 @@ RULE_START: int = 1
 
 # minimum number of lines to generate
 MIN_LINES: int = 1
-# maximum number of lines to generate.
-# This is an arbitrary but reasonable limit
-MAX_LINES: int = 99
+# maximum number of lines generated in the GUI, lines are generated
+# on a worker thread and shown as they arrive
+GUI_MAX_LINES: int = 10 ** 7
+# number of lines generated by the GUI between two progress updates
+GUI_CHUNK_LINES: int = 1 << 14
 # default number of lines to generate
 DEFAULT_LINES: int = 2
+# number of lines generated by each independent random stream
+# in parallel bulk generation
+BULK_BLOCK_LINES: int = 1 << 16
+# bulk generation methods, sampling the numbers of each line or
+# drawing the rank of each line, see bulk.py
+BULK_SAMPLE: str = "sample"
+BULK_RANK: str = "rank"
+BULK_METHODS: List[str] = [BULK_SAMPLE, BULK_RANK]
+# random number generator backends, see randomness.py
+RNG_MT: str = "mt"
+RNG_SECRETS: str = "secrets"
+RNG_PCG64: str = "pcg64"
+RNG_PHILOX: str = "philox"
+RNG_BACKENDS: List[str] = [RNG_MT, RNG_SECRETS, RNG_PCG64, RNG_PHILOX]
+# the default backends of engine.py and of bulk.py
+RNG_ENGINE_DEFAULT: str = RNG_MT
+RNG_BULK_DEFAULT: str = RNG_PCG64
+# bytes of random bits read at a time by the engine's buffered backends
+RNG_BUFFER_BYTES: int = 1 << 16
 
 # path to the saved files
 # currently a sub directory of the user's home directory
 SAVE_FILE_DIR: str = str(Path.home()) + "/lottery-db/"
 # filename extension for saved files
-SAVE_FILE_TYPE: str = ".db"
+SAVE_FILE_TYPE: str = ".lot"
+# filename extension for saved files of the original shelf format
+SHELF_FILE_TYPE: str = ".db"
+# JSON file of the rules of further lotteries, see rules.py
+RULES_FILE: str = SAVE_FILE_DIR + "rules.json"
+# path to the archive of every saved batch and the name of its index
+ARCHIVE_DIR: str = SAVE_FILE_DIR + "archive/"
+ARCHIVE_INDEX: str = "index.sqlite"
+# seconds to wait for another process writing to the archive index
+ARCHIVE_TIMEOUT: float = 30.0
+# filename extensions of the advisory lock of a file and of a file
+# being written, see store.py
+LOCK_FILE_TYPE: str = ".lock"
+TEMP_FILE_TYPE: str = ".tmp"
+# identifies a save file and the version of its format
+STORE_MAGIC: bytes = b"GLWX"
+STORE_VERSION: int = 1
+# encodings of the lines of a save file, packed numbers, ranks or
+# ranks in compressed blocks
+STORE_PACKED: int = 0
+STORE_RANKED: int = 1
+STORE_BLOCKED: int = 2
+# compression of the blocks of a save file, by name
+STORE_ZLIB: int = 1
+STORE_LZMA: int = 2
+STORE_CODECS: Dict[str, int] = {"zlib": STORE_ZLIB, "lzma": STORE_LZMA}
+# number of lines in each compressed block, only the block of a line
+# is decompressed to read it
+STORE_BLOCK_LINES: int = 1 << 12
+# number of lines copied at a time when a save file is recoded
+STORE_COPY_LINES: int = 1 << 16
 
 # a dictionary of shelf keys
 SHELF_ARGS: Dict[str, str] = {
@@ -68,8 +120,91 @@ SHELF_PROTOCOL: int = 4
 # file mode when reading saved file
 SHELF_READONLY: str = "r"
 
+# instrumentation of the controller actions, enabled by setting
+# the environment variable GENLOTTERY_INSTRUMENT
+INSTRUMENT: bool = bool(os.environ.get("GENLOTTERY_INSTRUMENT"))
+# directory to write Prometheus textfiles of the instrumentation to,
+# e.g. that of the node exporter textfile collector, empty for none
+METRICS_DIR: str = os.environ.get("GENLOTTERY_METRICS_DIR", "")
+# time the start of the GUI, importing the modules, building the main
+# frame and its first paint, enabled by setting the environment variable
+# GENLOTTERY_STARTUP, to exit once painted set it to exit
+STARTUP_TIMING: str = os.environ.get("GENLOTTERY_STARTUP", "")
+
 # date display format
 DATE_FORMAT: str = "%A %d %B %Y at %X %Z"
 
+# the prizes of a lottery as [main, extra] numbers matched, best first,
+# lotteries not listed win for any match
+PRIZE_TIERS: Dict[str, List[List[int]]] = {
+    LOTTERY_CHOICES[0]: [[6, 0], [5, 0], [4, 0], [3, 0], [2, 0]],
+    LOTTERY_CHOICES[1]: [
+        [5, 2], [5, 1], [5, 0], [4, 2], [4, 1], [3, 2], [4, 0],
+        [2, 2], [3, 1], [3, 0], [1, 2], [2, 1], [2, 0],
+    ],
+    LOTTERY_CHOICES[2]: [
+        [5, 1], [5, 0], [4, 1], [4, 0], [3, 1], [3, 0], [2, 1], [2, 0],
+    ],
+    LOTTERY_CHOICES[3]: [[5, 0]],
+    LOTTERY_CHOICES[4]: [[5, 0]],
+    LOTTERY_CHOICES[5]: [
+        [5, 1], [5, 0], [4, 1], [4, 0], [3, 1], [3, 0], [2, 1], [1, 1], [0, 1],
+    ],
+}
+# default number of draws of a simulation
+SIMULATE_DRAWS: int = 10 ** 6
+# formats of an exported batch, see export.py
+EXPORT_FORMATS: List[str] = ["csv", "jsonl", "parquet", "arrow"]
+# number of lines exported at a time
+EXPORT_CHUNK_LINES: int = 1 << 16
+# size of the write buffer of the text export formats
+EXPORT_BUFFER_SIZE: int = 1 << 20
+# number of winning lines listed for each prize tier by a check
+CHECK_REPORT_LINES: int = 20
+# number of simulated draws each worker process matches at a time
+SIMULATE_BLOCK_DRAWS: int = 1 << 16
+# largest number of line and draw pairs matched in one step, bounds the
+# memory used by a simulation, small enough to stay in the CPU cache
+SIMULATE_CHUNK_CELLS: int = 1 << 18
+# largest pool of numbers of a wheel, pool positions are bits of a uint64
+WHEEL_MAX_POOL: int = 64
+# largest number of groups of drawn numbers a wheel has to cover
+WHEEL_MAX_TARGETS: int = 1 << 22
+# number of candidate lines tried for each line of a wheel
+WHEEL_CANDIDATES: int = 64
+# number of uncovered groups the candidate lines of a wheel are compared on
+WHEEL_SAMPLE: int = 1 << 14
+# largest number of possible lines of a lottery for which the lines
+# already used are held in a bitmap rather than a set, 1 << 30 bits
+# is a bitmap of 128 MiB
+DEDUP_BITMAP_MAX_BITS: int = 1 << 30
+
+# number of lines in each chunk of a stream of generated lines
+STREAM_CHUNK_LINES: int = 1 << 16
+# number of chunks generated ahead of a slower consumer
+STREAM_QUEUE_CHUNKS: int = 4
+
+# address of the local service, see service.py, only the local host
+# should be used as the service has no authentication
+SERVICE_HOST: str = "127.0.0.1"
+SERVICE_PORT: int = int(os.environ.get("GENLOTTERY_SERVICE_PORT", 8765))
+# most lines the service generates or returns in one response
+SERVICE_MAX_LINES: int = 10 ** 5
+# lines waiting to be generated that make the service generate a batch
+# at once rather than when the event loop has handled the ready requests
+SERVICE_BATCH_LINES: int = 1 << 14
+# largest request body the service accepts
+SERVICE_MAX_BODY: int = 1 << 16
+# idle connections a service client keeps open for reuse
+SERVICE_POOL_SIZE: int = 8
+# seconds a service client waits for a response
+SERVICE_TIMEOUT: float = 30.0
+
+# number of lines the command line interface formats per write
+CLI_WRITE_LINES: int = 10000
+
+# number of lines visible in the results list before scrolling
+RESULTS_VISIBLE_LINES: int = 15
+
 FONT_POINT_SIZE: int = 14
 FONT_FACE: str = "Helvetica"
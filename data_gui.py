@@ -10,6 +10,54 @@ from common import ResultsData
 import constants as C
 
 
+class ResultsListCtrl(wx.ListCtrl):
+    """Virtual list of the lines of a results batch
+
+    Only the rows visible in the list are fetched from the results
+    and formatted, so any number of lines can be shown.
+    """
+
+    def __init__(self, parent, results: ResultsData) -> None:
+        wx.ListCtrl.__init__(
+            self,
+            parent,
+            id=wx.ID_ANY,
+            pos=wx.DefaultPosition,
+            size=wx.DefaultSize,
+            style=wx.LC_REPORT | wx.LC_VIRTUAL | wx.LC_HRULES | wx.BORDER_SUNKEN,
+        )
+        self.results = results
+        self.InsertColumn(col=0, heading="Line", format=wx.LIST_FORMAT_RIGHT)
+        self.InsertColumn(col=1, heading="Numbers")
+        self.SetItemCount(results.get_data_length())
+
+        # size the columns and the list to show the widest lines
+        sample: str = results.get_data_item(0) or ""
+        line_width: int = self.GetTextExtent(f"{self.GetItemCount():,}")[0]
+        numbers_width: int = self.GetTextExtent(sample)[0]
+        self.SetColumnWidth(col=0, width=max(line_width, 40) + 20)
+        self.SetColumnWidth(col=1, width=numbers_width + 20)
+        rows: int = min(max(self.GetItemCount(), 1), C.RESULTS_VISIBLE_LINES)
+        row_height: int = self.GetCharHeight() + 8
+        self.SetMinSize(
+            wx.Size(
+                self.GetColumnWidth(0) + self.GetColumnWidth(1) + 30,
+                (rows + 1) * row_height + 8,
+            )
+        )
+
+    def OnGetItemText(self, item: int, column: int) -> str:
+        """Return the text of a visible cell, called by wx.ListCtrl
+
+        :param item: the index of the line
+        :param column: 0 for the line number, 1 for the numbers
+        :return: str the text to display
+        """
+        if column == 0:
+            return f"{item + 1:,}"
+        return self.results.get_data_item(item) or ""
+
+
 class ResultsFrame(wx.Frame):
     """Data window of lottery generator
     """
@@ -51,14 +99,6 @@ class ResultsFrame(wx.Frame):
         :return:
         """
 
-        def unwrap(some: str) -> str:
-            """Remove characters "[". "]" and "'" from a string
-
-            :param some: str the string to process
-            :return:
-            """
-            return some.translate({ord(i): None for i in "[]'"})
-
         grid = wx.GridBagSizer(vgap=0, hgap=0)
         grid.SetFlexibleDirection(direction=wx.BOTH)
         grid.SetNonFlexibleGrowMode(mode=wx.FLEX_GROWMODE_SPECIFIED)
@@ -84,27 +124,16 @@ class ResultsFrame(wx.Frame):
             border=border,
         )
 
-        line: int = 0
-        for line in range(results.get_data_length()):
-            data_item = unwrap(results.get_data_item(line))
-            text: str = f"Line {line + 1}: " + data_item
-            control = wx.StaticText(
-                self,
-                id=wx.ID_ANY,
-                label=text,
-                pos=wx.Point(x=-1, y=-1),
-                size=wx.DefaultSize,
-                style=0,
-            )
-            grid.Add(
-                control,
-                pos=wx.GBPosition(row=line + 2, col=1),
-                span=span,
-                flag=flags,
-                border=border,
-            )
+        self.results_list = ResultsListCtrl(self, results)
+        grid.Add(
+            self.results_list,
+            pos=wx.GBPosition(row=2, col=1),
+            span=span,
+            flag=wx.EXPAND | wx.ALL,
+            border=border,
+        )
 
-        info = wx.StaticText(
+        self.info = wx.StaticText(
             self,
             id=wx.ID_ANY,
             label="",
@@ -113,17 +142,17 @@ class ResultsFrame(wx.Frame):
             style=0,
         )
         grid.Add(
-            info,
-            pos=wx.GBPosition(row=line + 3, col=1),
+            self.info,
+            pos=wx.GBPosition(row=3, col=1),
             span=span,
             flag=flags,
             border=border,
         )
 
         if results.is_retrieved():
-            info.SetLabelText("Saved on " + results.stored_date)
+            self.info.SetLabelText("Saved on " + results.stored_date)
         else:
-            info.SetLabelText("")
+            self.info.SetLabelText("")
 
         button_sizer = wx.StdDialogButtonSizer()
         ok_button = wx.Button(parent=self, id=wx.ID_OK)
@@ -131,7 +160,7 @@ class ResultsFrame(wx.Frame):
         button_sizer.Realize()
         grid.Add(
             button_sizer,
-            pos=wx.GBPosition(row=results.get_data_length() + 3, col=1),
+            pos=wx.GBPosition(row=4, col=1),
             span=wx.GBSpan(rowspan=1, colspan=2),
             flag=wx.ALIGN_CENTER_HORIZONTAL,
             border=5,
@@ -145,6 +174,15 @@ class ResultsFrame(wx.Frame):
             id=wx.ID_OK,
         )
 
+    def refresh(self, text: str = "") -> None:
+        """Show the lines added to the results since the last refresh
+
+        :param text: text to display below the lines, e.g. the progress
+        :return: None
+        """
+        self.results_list.SetItemCount(self.results_list.results.get_data_length())
+        self.info.SetLabelText(text)
+
     def on_ok(self, event) -> None:
         """Perform actions when OK button clicked
 
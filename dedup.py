@@ -0,0 +1,115 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator index of the lines already used
+
+Lines are identified by their combinatorial rank, see combinatorics.py.
+A RankSet is a bitmap of one bit per possible line when that is small
+enough, e.g. under 18 MB for EUROMILLIONS, otherwise a set of ranks,
+so checking a line is O(1) however many lines are held.
+"""
+from typing import TYPE_CHECKING, Iterable
+import constants as C
+import combinatorics
+import rules
+
+if TYPE_CHECKING:
+    # the archive, and sqlite3, are only needed once history is called
+    from archive import Archive
+
+
+class RankSet:
+    """The set of the ranks of the lines of a lottery
+    """
+
+    def __init__(self, lottery_type: int) -> None:
+        self.rule: rules.Rule = rules.get_rule(lottery_type)
+        self.capacity: int = combinatorics.line_count(self.rule)
+        self._size: int = 0
+        self._bitmap = None
+        self._ranks = None
+        if self.capacity <= C.DEDUP_BITMAP_MAX_BITS:
+            self._bitmap = bytearray(-(-self.capacity // 8))
+        else:
+            self._ranks = set()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, rank: int) -> bool:
+        if self._bitmap is None:
+            return rank in self._ranks
+        return bool(self._bitmap[rank >> 3] & (1 << (rank & 7)))
+
+    def add(self, rank: int) -> bool:
+        """Add the rank of a line
+
+        :param rank: the rank of the line
+        :return: bool True if the rank was not held before
+        """
+        if self._bitmap is None:
+            if rank in self._ranks:
+                return False
+            self._ranks.add(rank)
+        else:
+            byte, bit = rank >> 3, 1 << (rank & 7)
+            if self._bitmap[byte] & bit:
+                return False
+            self._bitmap[byte] |= bit
+        self._size += 1
+        return True
+
+    def update(self, ranks: Iterable[int]) -> None:
+        """Add the ranks of several lines
+
+        :param ranks: the ranks of the lines
+        :return: None
+        """
+        for rank in ranks:
+            self.add(rank)
+
+    def add_line(self, numbers) -> bool:
+        """Add a line
+
+        :param numbers: the main numbers followed by the extra numbers
+        :return: bool True if the line was not held before
+        """
+        return self.add(combinatorics.rank_line(self.rule, numbers))
+
+    def remaining(self) -> int:
+        """Return the number of lines that are not held
+
+        :return: int the number of possible lines not yet used
+        """
+        return self.capacity - self._size
+
+
+def history(archive: "Archive", lottery_type: int) -> RankSet:
+    """Return the lines of every archived batch of a lottery
+
+    The lines are ranked with NumPy if it is installed, see bulk.py.
+
+    :param archive: the archive of saved batches
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :return: the set of the archived lines
+    """
+    try:
+        import bulk
+    except ImportError:
+        bulk = None
+    seen = RankSet(lottery_type)
+    for info in archive.batches(lottery_type):
+        # a batch is read a part at a time, only the blocks of the part
+        # of a compressed batch are decompressed
+        with archive.reader(info) as reader:
+            header = reader.header
+            for start in range(0, len(reader), C.STORE_COPY_LINES):
+                data = reader.get_lines(start, start + C.STORE_COPY_LINES)
+                if bulk is None:
+                    seen.update(combinatorics.rank_buffer(seen.rule, data))
+                    continue
+                part = header._replace(lines=len(data) // header.line_width)
+                lines = bulk.batch_matrix(part, data)
+                seen.update(bulk.rank_lines(lottery_type, lines).tolist())
+    return seen
@@ -0,0 +1,310 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator engine, free of any GUI dependency
+"""
+from pathlib import Path
+from random import Random
+from typing import Iterable, Iterator, List, NamedTuple, Tuple, Union
+import glob
+import os
+import queue
+import threading
+import time
+import constants as C
+import randomness
+import rules
+from dedup import RankSet
+from instrument import Instrument
+
+
+class Line(NamedTuple):
+    """A single line of generated numbers
+    """
+
+    # the main group of numbers, sorted
+    main: Tuple[int, ...]
+    # the extra group of numbers, sorted, empty if the lottery has none
+    extra: Tuple[int, ...] = ()
+
+
+class SavedBatch(NamedTuple):
+    """A batch of lines read back from a save file
+    """
+
+    # time.time() when the batch was saved
+    date: float
+    lottery_type_name: str
+    lines: List[Line]
+
+
+def add_leading_zero(values: []) -> []:
+    """Add a leading zero to numbers in the list < 10
+
+    :param values: list of numbers
+    :return: array containing formatted numbers
+    """
+    return [f"{v:02d}" for v in values]
+
+
+def choose_numbers(maximum: int, quantity: int, rng: Random) -> List[int]:
+    """Generate the random numbers required
+
+    :param maximum: the highest number to choose from plus 1
+    :param quantity: the number of numbers to generate
+    :param rng: the random number generator to use
+    :return: a sorted list of generated numbers
+    """
+    valid_range: range = range(C.RULE_START, maximum)
+    return sorted(rng.sample(valid_range, quantity))
+
+
+def timed_choose(instrument: Union[Instrument, None]):
+    """Return choose_numbers, timing its rng and sort stages if the
+    instrument is enabled
+
+    :param instrument: records the rng and sort stages if given
+    :return: a function with the arguments of choose_numbers
+    """
+    if instrument is None or not instrument.enabled:
+        return choose_numbers
+
+    def choose(maximum: int, quantity: int, rng: Random) -> List[int]:
+        """choose_numbers timing the rng and sort stages"""
+        start = time.perf_counter()
+        numbers = rng.sample(range(C.RULE_START, maximum), quantity)
+        sort = time.perf_counter()
+        numbers.sort()
+        instrument.add("rng", sort - start)
+        instrument.add("sort", time.perf_counter() - sort)
+        return numbers
+
+    return choose
+
+
+def check_unused(seen: Union[RankSet, None], number_of_lines) -> None:
+    """Check enough lines that have not been seen remain
+
+    :param seen: the lines already used, None if any line may be used
+    :param number_of_lines: the number of lines required, None for any
+    :return: None
+    """
+    if seen is not None and seen.remaining() < (number_of_lines or 1):
+        raise ValueError(f"Only {seen.remaining():,} unused lines remain")
+
+
+def generate_lines(
+    lottery_type: int,
+    number_of_lines: int,
+    seed: Union[int, Random, None] = None,
+    instrument: Union[Instrument, None] = None,
+    seen: Union[RankSet, None] = None,
+    backend: str = C.RNG_ENGINE_DEFAULT,
+) -> List[Line]:
+    """Generate several lines of random numbers for a lottery
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param number_of_lines: the number of lines to generate
+    :param seed: seed for a reproducible run, None for a random one, or
+    a random.Random to carry on drawing from
+    :param instrument: records the rng and sort stages if given
+    :param seen: if given only lines not in seen are generated, and
+    they are added to it
+    :param backend: the random number generator, one of C.RNG_BACKENDS
+    :return: the generated lines
+    """
+    if number_of_lines < C.MIN_LINES:
+        raise ValueError(f"At least {C.MIN_LINES} line(s) must be generated")
+    check_unused(seen, number_of_lines)
+    rule = rules.get_rule(lottery_type)
+    rng = randomness.python_random(backend, seed)
+    choose = timed_choose(instrument)
+
+    lines: List[Line] = []
+    while len(lines) < number_of_lines:
+        # main_max and extra_max are the highest number to generate plus 1
+        x_1 = choose(maximum=rule.main_max, quantity=rule.main_qty, rng=rng)
+        # only generate the second group of numbers if required
+        x_2 = []
+        if rule.extra_qty:
+            x_2 = choose(maximum=rule.extra_max, quantity=rule.extra_qty, rng=rng)
+        # a line already seen is drawn again
+        if seen is None or seen.add_line(x_1 + x_2):
+            lines.append(Line(tuple(x_1), tuple(x_2)))
+    return lines
+
+
+def generate_chunks(
+    lottery_type: int,
+    number_of_lines: Union[int, None],
+    seed: Union[int, Random, None] = None,
+    chunk_lines: int = C.STREAM_CHUNK_LINES,
+    seen: Union[RankSet, None] = None,
+    backend: str = C.RNG_ENGINE_DEFAULT,
+    instrument: Union[Instrument, None] = None,
+) -> Iterator[bytes]:
+    """Generate lines in chunks packed as ResultsData and store.py hold them
+
+    A chunk is only generated when the consumer asks for it, so a slow
+    consumer slows generation down rather than letting chunks pile up.
+    The lines are the same as generate_lines gives for the same seed.
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param number_of_lines: the number of lines, None for an endless stream
+    :param seed: seed for a reproducible run, None for a random one, or
+    a random.Random to carry on drawing from
+    :param chunk_lines: the number of lines in each chunk but the last
+    :param seen: if given only lines not in seen are generated, and
+    they are added to it
+    :param backend: the random number generator, one of C.RNG_BACKENDS
+    :param instrument: records the rng and sort stages if given
+    :return: an iterator of the chunks
+    """
+    if number_of_lines is not None and number_of_lines < C.MIN_LINES:
+        raise ValueError(f"At least {C.MIN_LINES} line(s) must be generated")
+    check_unused(seen, number_of_lines)
+    rule = rules.get_rule(lottery_type)
+    rng = randomness.python_random(backend, seed)
+    choose = timed_choose(instrument)
+
+    remaining = number_of_lines
+    while remaining is None or remaining > 0:
+        size: int = chunk_lines
+        if remaining is not None:
+            size = min(size, remaining)
+            remaining -= size
+        chunk = bytearray()
+        while len(chunk) < size * rule.line_width:
+            # of an endless stream, a line is only drawn if one is left
+            check_unused(seen, 1)
+            numbers = choose(rule.main_max, rule.main_qty, rng)
+            if rule.extra_qty:
+                numbers += choose(rule.extra_max, rule.extra_qty, rng)
+            # a line already seen is drawn again
+            if seen is None or seen.add_line(numbers):
+                chunk += bytes(numbers)
+        yield bytes(chunk)
+
+
+def prefetch(chunks: Iterable, depth: int = C.STREAM_QUEUE_CHUNKS) -> Iterator:
+    """Produce chunks in a background thread while the consumer works
+
+    No more than depth chunks are held waiting for the consumer, when
+    the queue is full the producer waits.
+
+    :param chunks: the chunks to produce, e.g. from generate_chunks
+    :param depth: the most chunks to produce ahead of the consumer
+    :return: an iterator of the same chunks
+    """
+    pending: queue.Queue = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def produce() -> None:
+        try:
+            for chunk in chunks:
+                while not stop.is_set():
+                    try:
+                        pending.put(chunk, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+            pending.put(done)
+        except BaseException as error:
+            pending.put(error)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            chunk = pending.get()
+            if chunk is done:
+                return
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+    finally:
+        stop.set()
+
+
+def format_line(line: Line) -> str:
+    """Return the text used to display a line in the results
+
+    :param line: the line to format
+    :return: str the zero padded main and extra numbers
+    """
+    text: str = ", ".join(add_leading_zero(line.main))
+    if line.extra:
+        text += " - " + ", ".join(add_leading_zero(line.extra))
+    return text
+
+
+def save_lines(file_name: str, lottery_type: int, lines: List[Line]) -> None:
+    """Save a batch of lines to a shelf
+
+    :param file_name: the save file path name with no extension
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param lines: the lines to save
+    :return: None
+    """
+    import shelve
+    import store
+
+    directory = Path(file_name).parent
+    if not directory.exists():
+        directory.mkdir(parents=True)
+    # the shelf is written a key at a time under a temporary name, then
+    # its files are renamed while readers wait, see store.file_lock
+    temporary = Path(file_name).name + f".{os.urandom(8).hex()}{C.TEMP_FILE_TYPE}"
+    with shelve.open(
+        filename=str(directory / temporary), flag="n", protocol=C.SHELF_PROTOCOL
+    ) as shelf:
+        shelf[C.SHELF_ARGS["DATE"]] = time.time()
+        shelf[C.SHELF_ARGS["TYPE"]] = rules.get_rule(lottery_type).name
+        shelf[C.SHELF_ARGS["LINES"]] = len(lines)
+        for count, line in enumerate(lines):
+            shelf[C.SHELF_ARGS["PART1"] + str(count)] = add_leading_zero(
+                line.main
+            )
+            # Save the extra numbers even if there are none to save
+            # will return None on subsequent reading
+            x_2 = add_leading_zero(line.extra) if line.extra else [None]
+            shelf[C.SHELF_ARGS["PART2"] + str(count)] = x_2
+    # the dbm module in use may keep a shelf in several files, closing
+    # the shelf does not flush them to disk
+    paths = list(directory.glob(glob.escape(temporary) + "*"))
+    for path in paths:
+        with open(path, "rb") as written:
+            os.fsync(written.fileno())
+    with store.file_lock(file_name):
+        for path in paths:
+            os.replace(path, file_name + path.name[len(temporary):])
+        store.sync_directory(directory)
+
+
+def load_lines(file_name: str) -> SavedBatch:
+    """Read a batch of lines previously saved with save_lines
+
+    :param file_name: the save file path name with no extension
+    :return: the saved batch
+    """
+    import shelve
+    import store
+
+    with store.file_lock(file_name, shared=True), shelve.open(
+        filename=file_name, flag=C.SHELF_READONLY, protocol=C.SHELF_PROTOCOL
+    ) as shelf:
+        lines: List[Line] = []
+        for count in range(shelf[C.SHELF_ARGS["LINES"]]):
+            x_1 = shelf[C.SHELF_ARGS["PART1"] + str(count)]
+            x_2 = shelf[C.SHELF_ARGS["PART2"] + str(count)]
+            extra = () if x_2 == [None] else tuple(int(v) for v in x_2)
+            lines.append(Line(tuple(int(v) for v in x_1), extra))
+        return SavedBatch(
+            date=shelf[C.SHELF_ARGS["DATE"]],
+            lottery_type_name=shelf[C.SHELF_ARGS["TYPE"]],
+            lines=lines,
+        )
@@ -0,0 +1,190 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator export of saved batches for analysis
+
+A batch is exported a chunk of C.EXPORT_CHUNK_LINES lines at a time
+with one column per ball, main_1 ... main_n then extra_1 ... extra_n:
+
+    csv      comma separated numbers with a heading line
+    jsonl    one JSON object per line keyed by column name
+    parquet  a Parquet file of uint8 columns, one row group per chunk
+    arrow    an Arrow IPC file of uint8 columns, one record batch per chunk
+
+A batch of ranks is read from a store.BatchReader a chunk at a time.
+The text formats format a whole chunk with a single % operation and
+write it to a buffered binary stream. The columnar formats require
+pyarrow and, as it does, NumPy.
+"""
+from typing import BinaryIO, Iterator, List
+import constants as C
+import rules
+
+
+def column_names(rule: rules.Rule) -> List[str]:
+    """Return the name of the column of every ball of a line
+
+    :param rule: the rules of the lottery
+    :return: the main then the extra column names
+    """
+    return [f"main_{n + 1}" for n in range(rule.main_qty)] + [
+        f"extra_{n + 1}" for n in range(rule.extra_qty)
+    ]
+
+
+def iter_chunks(
+    rule: rules.Rule, data, chunk_lines: int = C.EXPORT_CHUNK_LINES
+) -> Iterator[memoryview]:
+    """Split packed lines into chunks without copying them
+
+    :param rule: the rules of the lottery
+    :param data: bytes like object of packed lines, or a
+    store.BatchReader to read a chunk at a time
+    :param chunk_lines: the number of lines in each chunk but the last
+    :return: an iterator of views of the chunks
+    """
+    if hasattr(data, "get_lines"):
+        for start in range(0, len(data), chunk_lines):
+            yield memoryview(data.get_lines(start, start + chunk_lines))
+        return
+    view = memoryview(data).cast("B")
+    size: int = chunk_lines * rule.line_width
+    for start in range(0, len(view), size):
+        yield view[start:start + size]
+
+
+def line_template(rule: rules.Rule, export_format: str) -> str:
+    """Return the % template of one line of a text format
+
+    :param rule: the rules of the lottery
+    :param export_format: csv or jsonl
+    :return: str the template, ending with a new line
+    """
+    if export_format == "csv":
+        return ",".join(["%d"] * rule.line_width) + "\n"
+    fields = ",".join(f'"{name}":%d' for name in column_names(rule))
+    return "{" + fields + "}\n"
+
+
+def write_text(
+    rule: rules.Rule, data, out: BinaryIO, export_format: str, heading: bool = True
+) -> int:
+    """Write packed lines as CSV or JSON Lines
+
+    :param rule: the rules of the lottery
+    :param data: bytes like object of packed lines
+    :param out: the binary stream to write to
+    :param export_format: csv or jsonl
+    :param heading: False to leave out the csv heading, when writing
+    a batch in several parts
+    :return: int the number of lines written
+    """
+    template: str = line_template(rule, export_format)
+    if export_format == "csv" and heading:
+        out.write((",".join(column_names(rule)) + "\n").encode("ascii"))
+    lines: int = 0
+    for chunk in iter_chunks(rule, data):
+        count: int = len(chunk) // rule.line_width
+        out.write((template * count % tuple(chunk)).encode("ascii"))
+        lines += count
+    return lines
+
+
+def arrow_schema(rule: rules.Rule, description: dict):
+    """Return the Arrow schema of the lines of a lottery
+
+    :param rule: the rules of the lottery
+    :param description: metadata of the batch, e.g. its lottery and date
+    :return: pyarrow.Schema of one uint8 column per ball
+    """
+    import pyarrow as pa
+
+    return pa.schema(
+        [pa.field(name, pa.uint8(), nullable=False) for name in column_names(rule)],
+        metadata={key: str(value) for key, value in description.items()},
+    )
+
+
+def record_batches(rule: rules.Rule, data, schema) -> Iterator:
+    """Convert packed lines to Arrow record batches without copying them
+
+    :param rule: the rules of the lottery
+    :param data: bytes like object of packed lines
+    :param schema: the schema from arrow_schema
+    :return: an iterator of pyarrow.RecordBatch, one per chunk
+    """
+    import numpy as np
+    import pyarrow as pa
+
+    for chunk in iter_chunks(rule, data):
+        matrix = np.frombuffer(chunk, dtype=np.uint8).reshape(-1, rule.line_width)
+        # a column of a C ordered matrix is strided, so it is copied
+        # into a contiguous array
+        columns = [
+            pa.array(np.ascontiguousarray(matrix[:, column]), type=pa.uint8())
+            for column in range(rule.line_width)
+        ]
+        yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def write_columnar(
+    rule: rules.Rule, data, file_name: str, export_format: str, description: dict
+) -> int:
+    """Write packed lines as a Parquet or an Arrow IPC file
+
+    :param rule: the rules of the lottery
+    :param data: bytes like object of packed lines
+    :param file_name: the file to write
+    :param export_format: parquet or arrow
+    :param description: metadata of the batch stored in the file
+    :return: int the number of lines written
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError(f"Exporting {export_format} requires pyarrow") from None
+
+    schema = arrow_schema(rule, description)
+    lines: int = 0
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(file_name, schema)
+    else:
+        writer = pa.ipc.new_file(file_name, schema)
+    with writer:
+        for batch in record_batches(rule, data, schema):
+            if export_format == "parquet":
+                writer.write_batch(batch, row_group_size=batch.num_rows)
+            else:
+                writer.write_batch(batch)
+            lines += batch.num_rows
+    return lines
+
+
+def export_batch(
+    lottery_type: int,
+    data,
+    file_name: str,
+    export_format: str,
+    description: dict = None,
+) -> int:
+    """Export packed lines to a file
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param data: bytes like object of packed lines, e.g. from
+    store.map_batch, or a store.BatchReader
+    :param file_name: the file to write
+    :param export_format: one of C.EXPORT_FORMATS
+    :param description: metadata of the batch, stored by the columnar
+    formats
+    :return: int the number of lines written
+    """
+    rule = rules.get_rule(lottery_type)
+    if export_format not in C.EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format}")
+    if export_format in ("parquet", "arrow"):
+        description = dict(description or {}, lottery=rule.name)
+        return write_columnar(rule, data, file_name, export_format, description)
+    with open(file_name, "wb", buffering=C.EXPORT_BUFFER_SIZE) as out:
+        return write_text(rule, data, out, export_format)
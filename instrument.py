@@ -0,0 +1,174 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator instrumentation of the controller actions
+
+An Instrument collects the time spent in each stage of an action,
+counters such as the lines and bytes written and the peak memory
+allocated. The results are logged as JSON and, if C.METRICS_DIR is
+set, written as a Prometheus textfile for the node exporter.
+"""
+from pathlib import Path
+from typing import Dict
+import contextlib
+import json
+import logging
+import os
+import time
+import tracemalloc
+import constants as C
+
+logger = logging.getLogger("lottery.instrument")
+
+
+class Instrument:
+    """Timings and counters of one action
+
+    A disabled instrument records nothing, so the controller can use one
+    unconditionally. Without trace_memory the peak memory is not
+    measured, tracing the allocations slows down e.g. importing modules.
+    Leaving a with block stops the tracing however the action ends.
+    """
+
+    def __init__(
+        self, action: str, enabled: bool = C.INSTRUMENT, trace_memory: bool = True
+    ) -> None:
+        self.action: str = action
+        self.enabled: bool = enabled
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.peak_memory: int = 0
+        self._start: float = time.perf_counter()
+        self._tracing: bool = (
+            enabled and trace_memory and not tracemalloc.is_tracing()
+        )
+        if self._tracing:
+            tracemalloc.start()
+
+    def add(self, stage: str, seconds: float) -> None:
+        """Add time spent in a stage
+
+        :param stage: the name of the stage
+        :param seconds: the time to add
+        :return: None
+        """
+        if self.enabled:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def stage(self, stage: str):
+        """Time the statements of a with block as a stage
+
+        :param stage: the name of the stage
+        :return: a context manager
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def count(self, counter: str, value: int) -> None:
+        """Add to a counter
+
+        :param counter: the name of the counter, e.g. lines
+        :param value: the amount to add
+        :return: None
+        """
+        if self.enabled:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def __enter__(self) -> "Instrument":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+    def stop(self) -> None:
+        """Stop tracing the memory allocations, without reporting, e.g.
+        when an action ends early or fails
+
+        :return: None
+        """
+        if self._tracing:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self._tracing = False
+
+    def finish(self) -> None:
+        """Stop measuring, log the results and write the metrics file
+
+        :return: None
+        """
+        if not self.enabled:
+            return
+        self.timings["total"] = time.perf_counter() - self._start
+        self.stop()
+        logger.info(json.dumps(self.as_dict()))
+        if C.METRICS_DIR:
+            write_textfile(self, C.METRICS_DIR)
+
+    def as_dict(self) -> dict:
+        """Return the results
+
+        :return: dict of the action, timings, counters and peak memory
+        """
+        return {
+            "action": self.action,
+            "seconds": self.timings,
+            "counters": self.counters,
+            "peak_memory": self.peak_memory,
+        }
+
+    def summary(self) -> str:
+        """Return the results as a short text for the status bar
+
+        :return: str the results
+        """
+        stages = ", ".join(
+            f"{stage} {seconds * 1000:.1f} ms"
+            for stage, seconds in self.timings.items()
+        )
+        counters = ", ".join(
+            f"{value:,} {counter}" for counter, value in self.counters.items()
+        )
+        return (
+            f"{self.action}: {stages}; {counters}; "
+            f"peak {self.peak_memory / 1024:,.0f} KiB"
+        )
+
+
+def write_textfile(instrument: Instrument, directory: str) -> None:
+    """Write the results in the Prometheus text format
+
+    Each action has its own lottery_<action>.prom file, replaced in one
+    step so the exporter never reads a partly written file.
+
+    :param instrument: the finished instrument
+    :param directory: the directory of the .prom files
+    :return: None
+    """
+    action: str = instrument.action
+    lines = [
+        "# HELP lottery_stage_seconds Time spent in a stage of the last action",
+        "# TYPE lottery_stage_seconds gauge",
+    ]
+    for stage, seconds in instrument.timings.items():
+        lines.append(
+            f'lottery_stage_seconds{{action="{action}",stage="{stage}"}} {seconds}'
+        )
+    lines.append("# TYPE lottery_count gauge")
+    for counter, value in instrument.counters.items():
+        lines.append(f'lottery_count{{action="{action}",counter="{counter}"}} {value}')
+    lines.append("# TYPE lottery_peak_memory_bytes gauge")
+    lines.append(
+        f'lottery_peak_memory_bytes{{action="{action}"}} {instrument.peak_memory}'
+    )
+    path = Path(directory) / f"lottery_{action}.prom"
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_text("\n".join(lines) + "\n")
+    os.replace(temporary, path)
@@ -4,10 +4,16 @@
 #   All rights reserved
 #
 """Lottery generator using wxPython
-"""
-import wx
 
-from options_control import GenLotteryMainFrame
+Run without arguments to start the GUI, with arguments (see --help)
+to use the command line interface, which does not need wxPython.
+With GENLOTTERY_STARTUP set the start of the GUI is timed, see
+C.STARTUP_TIMING, and python -X importtime lists the modules imported.
+"""
+import logging
+import sys
+import time
+import constants as C
 
 
 def main() -> None:
@@ -15,10 +21,38 @@ def main() -> None:
 
     :return: None
     """
+    if C.INSTRUMENT or C.STARTUP_TIMING:
+        # the instrumentation logs one JSON record per action
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if len(sys.argv) > 1:
+        import cli
+
+        sys.exit(cli.main())
+
+    from instrument import Instrument
+
+    startup = Instrument("startup", bool(C.STARTUP_TIMING), trace_memory=False)
+    with startup.stage("import wx"):
+        import wx
+    with startup.stage("import gui"):
+        from options_control import GenLotteryMainFrame
+    with startup.stage("frame"):
+        app = wx.App()
+        frm = GenLotteryMainFrame(parent=None)
+        frm.Show()
+    if startup.enabled:
+        shown: float = time.perf_counter()
+
+        def on_first_idle(event) -> None:
+            # idle events follow the paint events of the shown frame
+            frm.Unbind(wx.EVT_IDLE, handler=on_first_idle)
+            startup.add("first paint", time.perf_counter() - shown)
+            frm.finish_instrument(startup)
+            if C.STARTUP_TIMING == "exit":
+                frm.Close(force=True)
+            event.Skip()
 
-    app = wx.App()
-    frm = GenLotteryMainFrame(parent=None)
-    frm.Show()
+        frm.Bind(wx.EVT_IDLE, on_first_idle)
     app.MainLoop()
 
 
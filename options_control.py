@@ -3,19 +3,26 @@
 #   All rights reserved
 #
 """Lottery generator using wxPython
+
+Only what the main frame needs to be shown is imported with the module,
+the modules of each action, e.g. the archive, the results window and
+wx.adv, are imported the first time the action is used.
 """
 
 from pathlib import Path
-from random import sample
-from typing import List, Union
-import shelve
+from typing import TYPE_CHECKING, Union
 import time
 import wx
-import wx.adv
 import constants as C
+import engine
 import options_gui
-from common import OptionsData, ResultsData
-from data_gui import ResultsFrame
+import rules
+from common import OptionsData, ResultsData, open_results
+from instrument import Instrument
+
+if TYPE_CHECKING:
+    from data_gui import ResultsFrame
+    from worker import GenerateJob
 
 
 class GenLotteryMainFrame(options_gui.MainFrame):
@@ -23,11 +30,16 @@ class GenLotteryMainFrame(options_gui.MainFrame):
     """
 
     options_data = OptionsData()
-    # This is the save file path name with no extension
+    # This is the path name with no extension of a save file
+    # of the original shelf format, newer batches are archived
     _saved_file: str = C.SAVE_FILE_DIR + options_data.get_lottery_name()
 
     def __init__(self, parent):
         options_gui.MainFrame.__init__(self, parent)
+        # the generation running on a worker thread, if any
+        self.job: Union["GenerateJob", None] = None
+        self.results: Union[ResultsData, None] = None
+        self.results_frame: Union["ResultsFrame", None] = None
         self.update_status()
 
     def update_status(self, text=None) -> None:
@@ -45,6 +57,7 @@ class GenLotteryMainFrame(options_gui.MainFrame):
                 f"{opt.get_lottery_name()}"
                 f", Lines: "
                 f"{opt.number_of_lines}"
+                f"{', no repeats' if opt.unique else ''}"
             )
         else:
             status_bar.SetStatusText(text)
@@ -54,7 +67,20 @@ class GenLotteryMainFrame(options_gui.MainFrame):
         self.Close(force=True)
         event.Skip()
 
+    def on_close(self, event):
+        """Stop a running job before the frame is destroyed."""
+        job, self.job = self.job, None
+        if job is not None:
+            # the callbacks it has already posted see it is no longer
+            # the frame's job and do nothing
+            job.cancel()
+            job.join()
+            job.instrument.stop()
+        event.Skip()
+
     def on_about(self, _):
+        import wx.adv
+
         about_info = wx.adv.AboutDialogInfo()
         about_info.SetName(C.PROGRAM)
         about_info.SetVersion(C.VERSION)
@@ -67,8 +93,7 @@ class GenLotteryMainFrame(options_gui.MainFrame):
     def on_type_combo(self, event):
         opt = self.options_data
         opt.lottery_type = event.GetSelection()
-        opt.lottery_type_name = C.LOTTERY_CHOICES[opt.lottery_type]
-        self._saved_file = C.SAVE_FILE_DIR + opt.lottery_type_name
+        self._saved_file = C.SAVE_FILE_DIR + opt.get_lottery_name()
 
         self.update_status()
         event.Skip()
@@ -86,12 +111,27 @@ class GenLotteryMainFrame(options_gui.MainFrame):
         self.update_status()
         event.Skip()
 
+    def on_unique_check(self, event):
+        opt = self.options_data
+        opt.unique = event.IsChecked()
+        self.update_status()
+        event.Skip()
+
     def on_cancel(self, event):
-        self.on_exit(event)
+        if self.job is None:
+            self.on_exit(event)
+            return
+        self.job.cancel()
+        self.update_status("Cancelling")
+        event.Skip()
 
     def on_ok(self, event):
         opt = self.options_data
-        if opt.option == 3:
+        if self.job is not None:
+            pass
+        elif opt.option == 4:
+            self.check_saved()
+        elif opt.option == 3:
             self.delete_saved_file()
         elif opt.option == 2:
             self.show_saved()
@@ -100,146 +140,185 @@ class GenLotteryMainFrame(options_gui.MainFrame):
         event.Skip()
 
     def generate_numbers(self) -> None:
-        """Generate several random numbers and optionally save them
-        :return:
+        """Start generating numbers on a worker thread, optionally saving them
+        :return: None
         """
-
-        def add_leading_zero(values: []) -> []:
-            """Add a leading zero to numbers in the list < 10
-            :param values: list of numbers
-            :return: array containing formatted numbers
-            """
-            return [f"{v:02d}" for v in values]
-
-        def choose_numbers(maximum: int, quantity: int) -> []:
-            """Generate the random numbers required
-            :param maximum: the highest number to choose from
-            :param quantity: the number of numbers to generate
-            :return: a sorted list of generated numbers
-            """
-            valid_range: range = range(C.RULE_START, maximum)
-            return add_leading_zero(sorted(sample(valid_range, quantity)))
-
-        result = ResultsData
-        result.clear_data()
+        from worker import GenerateJob
 
         opt = self.options_data
-        result.lottery_type_name = opt.get_lottery_name()
-        result.number_of_lines = opt.number_of_lines
+        # option 1 is No Save
+        self.results = ResultsData(opt.lottery_type, saved=opt.option != 1)
+        self.results_frame = None
+        self.job = GenerateJob(
+            opt.lottery_type,
+            opt.number_of_lines,
+            post=wx.CallAfter,
+            on_chunk=self.on_generate_chunk,
+            on_done=self.on_generate_done,
+            save=self.results.saved,
+            unique=opt.unique,
+        )
+        self.ok_button.Disable()
+        self.update_status(f"Generating {opt.number_of_lines:,} lines, Cancel to stop")
+        self.job.start()
 
-        main_max, main_qty,\
-            extra_max, extra_qty = C.RULES[opt.get_lottery_name()]
+    def on_generate_chunk(self, job: "GenerateJob", chunk: bytes) -> None:
+        """Show a chunk of lines generated by the worker thread
+        :param job: the job that generated the chunk
+        :param chunk: the packed lines
+        :return: None
+        """
+        # posted before the frame was closed
+        if job is not self.job or not self:
+            return
+        with job.instrument.stage("pack"):
+            self.results.append_buffer(chunk)
+        progress: str = (
+            f"Generated {self.results.get_data_length():,} of "
+            f"{job.number_of_lines:,} lines"
+        )
+        # the frame is shown with the first chunk and follows the others
+        # unless the user closes it
+        if self.results_frame is None:
+            from data_gui import ResultsFrame
 
-        shelf = None
-        result.generated = True
-        if opt.option == 1:
-            msg: str = "The generated numbers have not been saved"
-            result.saved = False
-            self.update_status(msg)
+            with job.instrument.stage("frame"):
+                self.results_frame = ResultsFrame(None, self.results)
+                self.results_frame.Show()
+        if self.results_frame:
+            self.results_frame.refresh(progress)
+        self.update_status(progress + ", Cancel to stop")
+
+    def on_generate_done(self, job: "GenerateJob") -> None:
+        """Report the end of the worker thread
+        :param job: the finished job
+        :return: None
+        """
+        # posted before the frame was closed
+        if job is not self.job or not self:
+            return
+        self.job = None
+        self.ok_button.Enable()
+        if job.error is not None:
+            msg: str = str(job.error)
+        elif job.info is None and job.cancelled:
+            msg = f"Cancelled after {job.lines:,} lines, the numbers have not been saved"
         else:
-            result.saved = True
-            directory = Path(C.SAVE_FILE_DIR)
-            if not directory.exists():
-                directory.mkdir(parents=True)
-            shelf = shelve.open(filename=self._saved_file,
-                                protocol=C.SHELF_PROTOCOL)
-            shelf[C.SHELF_ARGS["DATE"]] = time.time()
-            shelf[C.SHELF_ARGS["TYPE"]] = C.LOTTERY_CHOICES[opt.lottery_type]
-            shelf[C.SHELF_ARGS["LINES"]] = opt.number_of_lines
-
-        # count the actual number of lines generated
-        count: int = 0
-        # generate the required number of lines
-        for _ in range(opt.number_of_lines):
-            # x_1 holds the first group of numbers generated
-            # main_max is the the highest number to generate plus 1
-            # main_qty is the quantity of numbers to generate each line
-            x_1: List[str] = choose_numbers(maximum=main_max,
-                                            quantity=main_qty)
-
-            # x_2 holds the secondary group of numbers generated if
-            # any are required
-            # extra_max is the the highest number to generate plus 1
-            # extra_qty is the quantity of numbers to
-            # generate in each line
-            x_2: List[Union[str, None]] = [None]
-            # only generate the second group of numbers if required
-            # if extra_qty > 0
-            if extra_qty:
-                x_2 = choose_numbers(maximum=extra_max, quantity=extra_qty)
-            # If shelf is None it means no_save was specified
-            if shelf is not None:
-                shelf[C.SHELF_ARGS["PART1"] + str(count)] = x_1
-                # Save the extra numbers even if there are none to save
-                # will return None on subsequent reading
-                shelf[C.SHELF_ARGS["PART2"] + str(count)] = x_2
-            count += 1
-            if x_2 == [None]:
-                result.data.append(str(x_1))
-            else:
-                result.data.append(str(x_1) + " - " + str(x_2))
-        # close the save file if there is one
-        if opt.get_option_name() != C.OPTIONS_CHOICES[1]:
-            shelf.close()
-        test: bool = opt.get_option_name() == C.OPTIONS_CHOICES[1]
-        msg: str = (
-            f"The numbers have{' not' if test else ''}"
-            f" been saved and {count} lines were generated"
-        )
+            msg = (
+                f"The numbers have{'' if job.info else ' not'}"
+                f" been saved and {job.lines:,} lines were generated"
+            )
+        if self.results_frame:
+            self.results_frame.refresh()
         self.update_status(msg)
-        frm = ResultsFrame(None, result)
-        frm.Show()
+        self.finish_instrument(job.instrument)
+
+    def finish_instrument(self, instrument: Instrument) -> None:
+        """Report the timings of an action if instrumentation is enabled
+        :param instrument: the instrument of the action
+        :return: None
+        """
+        if instrument.enabled:
+            instrument.finish()
+            self.update_status(instrument.summary())
 
     def delete_saved_file(self) -> None:
-        """Delete a previously saved file
+        """Delete the latest saved batch
         :return: None
         """
-        # add the filename extension
-        file_name: str = self._saved_file + C.SAVE_FILE_TYPE
-        path = Path(file_name)
-        file_exists: bool = path.exists()
-        if file_exists:
-            path.unlink()
-        msg: str = f"File: <{file_name}> was "\
-            f"{'deleted' if file_exists else 'not found'}"
-        self.update_status(msg)
+        from archive import Archive
+
+        opt = self.options_data
+        with Instrument("delete") as instrument:
+            with instrument.stage("delete"), Archive() as archive:
+                info = archive.latest(opt.lottery_type)
+                if info is not None:
+                    file_name: str = str(archive.batch_path(info))
+                    archive.delete(info)
+            file_exists: bool = info is not None
+            if not file_exists:
+                # a file of the original shelf format
+                file_name = self._saved_file + C.SHELF_FILE_TYPE
+                path = Path(file_name)
+                file_exists = path.exists()
+                if file_exists:
+                    path.unlink()
+            msg: str = f"File: <{file_name}> was "\
+                f"{'deleted' if file_exists else 'not found'}"
+            self.update_status(msg)
+            self.finish_instrument(instrument)
+
+    def check_saved(self) -> None:
+        """Check every saved batch against the winning numbers of a draw
+        :return: None
+        """
+        import wx.lib.dialogs
+        import check
+        from archive import Archive
+
+        opt = self.options_data
+        rule = rules.get_rule(opt.lottery_type)
+        with wx.TextEntryDialog(
+            self,
+            message=f"Enter the {rule.name} winning numbers, "
+            f"e.g. {rule.format(range(1, 99))}",
+            caption=f"{C.PROGRAM} - Check",
+        ) as dialog:
+            if dialog.ShowModal() != wx.ID_OK:
+                return
+            text: str = dialog.GetValue()
+        try:
+            draw = check.parse_draw(rule, text)
+        except ValueError as error:
+            self.update_status(str(error))
+            return
+        with Instrument("check") as instrument:
+            with instrument.stage("check"), Archive() as archive:
+                batches, wins = check.check_archive(archive, opt.lottery_type, draw)
+            instrument.count("lines", sum(info.lines for info in batches))
+            if not batches:
+                self.update_status(
+                    f"No saved {opt.get_lottery_name()} numbers were found"
+                )
+                return
+            with wx.lib.dialogs.ScrolledMessageDialog(
+                self, check.report(rule, draw, batches, wins), f"{C.PROGRAM} - Check"
+            ) as dialog:
+                dialog.ShowModal()
+            self.finish_instrument(instrument)
 
     def show_saved(self) -> None:
-        """Display a previously generated and saved batch of numbers
+        """Display the latest saved batch of numbers
         :return: None
         """
+        from archive import Archive
+        from data_gui import ResultsFrame
+
         opt = self.options_data
-        # add the filename extension
-        path = Path(self._saved_file + C.SAVE_FILE_TYPE)
-        if path.exists() and path.is_file():
-            shelf = shelve.open(
-                filename=self._saved_file,
-                flag=C.SHELF_READONLY,
-                protocol=C.SHELF_PROTOCOL,
-            )
-            save_time = time.localtime(shelf[C.SHELF_ARGS["DATE"]])
-            result = ResultsData
-            result.clear_data()
-
-            result.saved = False
-            result.generated = False
-            result.lottery_type_name = opt.get_lottery_name()
-            result.stored_date = time.strftime(C.DATE_FORMAT, save_time)
-            count: int = 0
-            for line in range(shelf[C.SHELF_ARGS["LINES"]]):
-                # Don't display second group if none exist
-                x_1: List[str] = shelf[C.SHELF_ARGS["PART1"] + str(line)]
-                x_2: List[Union[str, None]] = shelf[C.SHELF_ARGS["PART2"]
-                                                    + str(line)]
-                if x_2 == [None]:
-                    result.set_data_item(str(x_1))
-                else:
-                    result.set_data_item(str(x_1) + " - " + str(x_2))
-                count += 1
-            result.number_of_lines = count
-            shelf.close()
-            frm = ResultsFrame(None, result)
-            frm.Show()
-        else:
-            msg: str = f"File <{path}> is missing"
-            self.update_status(msg)
+        with Instrument("show") as instrument:
+            with instrument.stage("open"), Archive() as archive:
+                info = archive.latest(opt.lottery_type)
+                if info is not None:
+                    result = open_results(archive, info)
+            # a file of the original shelf format
+            shelf_path = Path(self._saved_file + C.SHELF_FILE_TYPE)
+            if info is None and shelf_path.is_file():
+                with instrument.stage("open"):
+                    batch = engine.load_lines(self._saved_file)
+                save_time = time.localtime(batch.date)
+                result = ResultsData(
+                    opt.lottery_type,
+                    generated=False,
+                    stored_date=time.strftime(C.DATE_FORMAT, save_time),
+                )
+                for line in batch.lines:
+                    result.set_data_item(line)
+            elif info is None:
+                msg: str = f"No saved {opt.get_lottery_name()} numbers were found"
+                self.update_status(msg)
+                return
+            instrument.count("lines", result.get_data_length())
+            with instrument.stage("frame"):
+                frm = ResultsFrame(None, result)
+                frm.Show()
+            self.finish_instrument(instrument)
@@ -5,11 +5,11 @@
 """Lottery generator GUI interface using wxPython
 """
 import wx
-import wx.adv
 from wx.lib import intctrl
 
 from common import OptionsData
 import constants as C
+import rules
 
 
 class MainFrame(wx.Frame):
@@ -85,6 +85,7 @@ class MainFrame(wx.Frame):
         self.SetMenuBar(menuBar=main_menu_bar)
 
         self.Bind(event=wx.EVT_MENU, handler=self.on_exit, source=exit_menu_item)
+        self.Bind(event=wx.EVT_CLOSE, handler=self.on_close)
         self.Bind(event=wx.EVT_MENU, handler=self.on_about, source=about_menu_item)
 
     def make_main_controls(self):
@@ -116,10 +117,10 @@ class MainFrame(wx.Frame):
         lottery_combo = wx.ComboBox(
             self,
             id=self.ID_LOTTERY_TYPE,
-            value=C.LOTTERY_CHOICES[opt.lottery_type],
+            value=rules.get_rule(opt.lottery_type).name,
             pos=wx.DefaultPosition,
             size=wx.DefaultSize,
-            choices=C.LOTTERY_CHOICES,
+            choices=rules.names(),
             style=wx.CB_READONLY,
         )
 
@@ -155,14 +156,14 @@ class MainFrame(wx.Frame):
             size=wx.DefaultSize,
             style=0,
             validator=wx.DefaultValidator,
-            min=1,
-            max=99,
+            min=C.MIN_LINES,
+            max=C.GUI_MAX_LINES,
             limited=True,
             allow_none=False,
             allow_long=False,
         )
-        lines_control.SetMaxLength(len=2)
-        lines_control.SetMaxSize(size=wx.Size(30, -1))
+        lines_control.SetMaxLength(len=len(str(C.GUI_MAX_LINES)))
+        lines_control.SetMaxSize(size=wx.Size(80, -1))
         grid.Add(
             lines_control,
             pos=wx.GBPosition(row=2, col=2),
@@ -191,9 +192,26 @@ class MainFrame(wx.Frame):
             border=5,
         )
 
+        unique_check = wx.CheckBox(
+            self,
+            id=wx.ID_ANY,
+            label=u"No repeated lines",
+            pos=wx.DefaultPosition,
+            size=wx.DefaultSize,
+            style=0,
+        )
+        unique_check.SetValue(opt.unique)
+        grid.Add(
+            unique_check,
+            pos=wx.GBPosition(row=4, col=1),
+            span=wx.GBSpan(rowspan=1, colspan=2),
+            flag=wx.ALIGN_CENTER_VERTICAL | wx.ALL,
+            border=5,
+        )
+
         button_sizer = wx.StdDialogButtonSizer()
-        ok_button = wx.Button(parent=self, id=wx.ID_OK)
-        button_sizer.AddButton(button=ok_button)
+        self.ok_button = wx.Button(parent=self, id=wx.ID_OK)
+        button_sizer.AddButton(button=self.ok_button)
         cancel_button = wx.Button(parent=self, id=wx.ID_CANCEL)
         button_sizer.AddButton(button=cancel_button)
         button_sizer.Realize()
@@ -213,8 +231,12 @@ class MainFrame(wx.Frame):
             event=intctrl.EVT_INT, handler=self.on_line_control, source=lines_control
         )
         radio_box.Bind(event=wx.EVT_RADIOBOX, handler=self.on_radiobox)
+        unique_check.Bind(event=wx.EVT_CHECKBOX, handler=self.on_unique_check)
         self.Bind(
-            event=wx.EVT_BUTTON, handler=self.on_ok, source=ok_button, id=wx.ID_OK
+            event=wx.EVT_BUTTON,
+            handler=self.on_ok,
+            source=self.ok_button,
+            id=wx.ID_OK,
         )
         self.Bind(
             event=wx.EVT_BUTTON,
@@ -240,6 +262,14 @@ class MainFrame(wx.Frame):
         """
         event.Skip()
 
+    def on_close(self, event):
+        """Perform actions when the frame is closed, e.g. by its title bar
+
+        :param event:
+        :return:
+        """
+        event.Skip()
+
     def on_about(self, event):
         """Perform actions when user requests an about box
 
@@ -272,6 +302,14 @@ class MainFrame(wx.Frame):
         """
         event.Skip()
 
+    def on_unique_check(self, event):
+        """Perform actions when user changes the repeated lines check box
+
+        :param event:
+        :return:
+        """
+        event.Skip()
+
     def on_cancel(self, event):
         """Perform actions when user presses the Cancel button
 
@@ -0,0 +1,218 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator random number generator backends
+
+    mt       the Mersenne Twister, random.Random for the engine and
+             MT19937 for bulk.py
+    secrets  the operating system's CSPRNG, os.urandom, which can not
+             be seeded, for draws that must not be predictable
+    pcg64    NumPy's PCG64, the default of bulk.py
+    philox   NumPy's Philox, a counter based generator
+
+Random bits are read a buffer at a time rather than a call per ball:
+the engine's backends other than mt are a BufferedRandom refilled
+C.RNG_BUFFER_BYTES at a time, and the secrets backend of bulk.py reads
+all the numbers of a column of a block with one os.urandom call. The
+backends other than mt and secrets require NumPy.
+"""
+from random import Random
+from typing import Callable, Dict
+import os
+import constants as C
+
+# the NumPy bit generator of each backend
+BIT_GENERATORS: Dict[str, str] = {
+    C.RNG_MT: "MT19937",
+    C.RNG_PCG64: "PCG64",
+    C.RNG_PHILOX: "Philox",
+}
+
+
+class BufferedRandom(Random):
+    """A Random drawing its bits from a buffer of 32 bit words
+
+    The buffer is refilled by calling fill with the number of bytes
+    wanted, so a source with a costly call, e.g. os.urandom, is called
+    once per C.RNG_BUFFER_BYTES rather than once per number. It can not
+    be seeded or have its state saved, the source is seeded instead.
+    """
+
+    def __init__(
+        self, fill: Callable[[int], bytes], buffer_size: int = C.RNG_BUFFER_BYTES
+    ) -> None:
+        self._fill = fill
+        self._buffer_size: int = buffer_size
+        self._words = iter(())
+        Random.__init__(self)
+
+    def _refill(self) -> None:
+        self._words = iter(memoryview(self._fill(self._buffer_size)).cast("I"))
+
+    def getrandbits(self, k: int) -> int:
+        """Return an int of k random bits
+
+        :param k: the number of bits
+        :return: int from 0 to 2 ** k - 1
+        """
+        if 0 <= k <= 32:
+            try:
+                word = next(self._words)
+            except StopIteration:
+                self._refill()
+                word = next(self._words)
+            return word >> (32 - k)
+        if k < 0:
+            raise ValueError("number of bits must be non-negative")
+        words: int = -(-k // 32)
+        value: int = 0
+        for _ in range(words):
+            value = value << 32 | self.getrandbits(32)
+        return value >> (words * 32 - k)
+
+    def _randbelow(self, n: int) -> int:
+        # sample, choice, randrange etc. call this for every number,
+        # taking the words straight from the buffer saves calling
+        # getrandbits for each one
+        if not 0 < n < 1 << 32:
+            return self._randbelow_with_getrandbits(n)
+        shift: int = 32 - n.bit_length()
+        while True:
+            for word in self._words:
+                if word >> shift < n:
+                    return word >> shift
+            self._refill()
+
+    def random(self) -> float:
+        """Return a float from 0.0 up to 1.0 with 53 random bits
+
+        :return: float the random number
+        """
+        return (self.getrandbits(27) * 67108864 + self.getrandbits(26)) * 2.0 ** -53
+
+    def seed(self, *args, **kwargs) -> None:
+        """Do nothing, as random.SystemRandom
+
+        :return: None
+        """
+
+    def getstate(self):
+        raise NotImplementedError("The state of a BufferedRandom can not be saved")
+
+    def setstate(self, state):
+        raise NotImplementedError("The state of a BufferedRandom can not be set")
+
+
+class SecretsGenerator:
+    """The part of numpy.random.Generator used by bulk.py, reading the
+    operating system's CSPRNG
+
+    Each call reads all the bytes it needs with one os.urandom call, in
+    the smallest words that keep the chance of a rejected number under
+    1 in 256.
+    """
+
+    def integers(self, low, high=None, size=None, endpoint: bool = False):
+        """Return uniform random integers, as numpy.random.Generator
+
+        :param low: the lowest integer, or high if high is None
+        :param high: one above the highest integer, or the highest if
+        endpoint is True
+        :param size: the shape of the result, None for a single integer
+        :param endpoint: True to include high
+        :return: int64 array of the shape size, or an int
+        """
+        import numpy as np
+
+        if high is None:
+            low, high = 0, low
+        span: int = int(high) - int(low) + bool(endpoint)
+        if span < 1:
+            raise ValueError("low must be less than high")
+        count: int = 1 if size is None else int(np.prod(size))
+        for dtype in (np.uint16, np.uint32, np.uint64):
+            if np.iinfo(dtype).bits >= span.bit_length() + 8:
+                break
+        bits: int = np.iinfo(dtype).bits
+        # the words from limit up would make the low numbers more likely
+        limit: int = (1 << bits) // span * span
+        parts = []
+        while count:
+            words = np.frombuffer(os.urandom(count * bits // 8), dtype=dtype)
+            if limit < 1 << bits:
+                words = words[words < dtype(limit)]
+            parts.append(words % dtype(span))
+            count -= len(words)
+        values = np.concatenate(parts).astype(np.int64) + int(low)
+        return int(values[0]) if size is None else values.reshape(size)
+
+
+def check_unseeded(backend: str, seed) -> None:
+    """Check a seed is not given to the secrets backend
+
+    :param backend: one of C.RNG_BACKENDS
+    :param seed: the seed given
+    :return: None
+    """
+    if backend == C.RNG_SECRETS and seed is not None:
+        raise ValueError(f"The {C.RNG_SECRETS} generator can not be seeded")
+
+
+def bit_generator(backend: str, seed):
+    """Return a NumPy bit generator
+
+    :param backend: one of BIT_GENERATORS
+    :param seed: int, numpy.random.SeedSequence or None for a random one
+    :return: numpy.random.BitGenerator
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ValueError(f"The {backend} generator requires NumPy") from None
+    return getattr(np.random, BIT_GENERATORS[backend])(seed)
+
+
+def python_random(backend: str = C.RNG_ENGINE_DEFAULT, seed=None) -> Random:
+    """Return a generator for engine.py
+
+    :param backend: one of C.RNG_BACKENDS
+    :param seed: int for a reproducible run, None for a random one, or
+    a Random to carry on drawing from, which is returned as it is
+    :return: random.Random of the backend
+    """
+    if isinstance(seed, Random):
+        return seed
+    check_unseeded(backend, seed)
+    if backend == C.RNG_MT:
+        return Random(seed)
+    if backend == C.RNG_SECRETS:
+        return BufferedRandom(os.urandom)
+    if backend not in BIT_GENERATORS:
+        raise ValueError(f"Unknown random number generator {backend}")
+    source = bit_generator(backend, seed)
+    return BufferedRandom(lambda size: source.random_raw(size // 8).tobytes())
+
+
+def numpy_generator(backend: str = C.RNG_BULK_DEFAULT, seed=None):
+    """Return a generator for bulk.py
+
+    :param backend: one of C.RNG_BACKENDS
+    :param seed: int or numpy.random.SeedSequence for a reproducible
+    run, None for a random one, or a generator to carry on drawing from,
+    which is returned as it is, as numpy.random.default_rng does
+    :return: numpy.random.Generator of the backend, a SecretsGenerator
+    for the secrets backend
+    """
+    import numpy as np
+
+    if isinstance(seed, (np.random.Generator, SecretsGenerator)):
+        return seed
+    check_unseeded(backend, seed)
+    if backend == C.RNG_SECRETS:
+        return SecretsGenerator()
+    if backend not in BIT_GENERATORS:
+        raise ValueError(f"Unknown random number generator {backend}")
+
+    return np.random.Generator(bit_generator(backend, seed))
+
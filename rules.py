@@ -0,0 +1,236 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator registry of compiled lottery rules
+
+The rules of C.RULES, followed by those of the lotteries defined in
+C.RULES_FILE if it exists, are validated once when this module is
+imported. Each lottery is identified by its rule id, the index of its
+rule in RULES, which is the lottery_type used throughout the program
+and stored in save files. The ids of the lotteries of C.RULES are their
+index in C.LOTTERY_CHOICES, those of the rules file follow in the order
+of the file, so new lotteries must be added at the end of the file.
+
+The rules file is a JSON object of lottery names and rules in the
+format of C.RULES, e.g.
+    {"EUROJACKPOT": [51, 5, 13, 2], "PICK3": [10, 3, 0, 0]}
+"""
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+import json
+import constants as C
+
+
+class Rule:
+    """The read only, compiled rules of a lottery
+    """
+
+    __slots__ = (
+        "rule_id",
+        "name",
+        "main_max",
+        "main_qty",
+        "extra_max",
+        "extra_qty",
+        "main_range",
+        "extra_range",
+        "line_width",
+        "template",
+    )
+
+    def __init__(
+        self,
+        rule_id: int,
+        name: str,
+        main_max: int,
+        main_qty: int,
+        extra_max: int,
+        extra_qty: int,
+    ) -> None:
+        # False is accepted for the extra numbers as used in C.RULES
+        extra_max, extra_qty = extra_max or 0, extra_qty or 0
+        validate(name, main_max, main_qty, extra_max, extra_qty)
+        template: str = ", ".join(["{:02d}"] * main_qty)
+        if extra_qty:
+            template += " - " + ", ".join(["{:02d}"] * extra_qty)
+        for slot, value in (
+            ("rule_id", rule_id),
+            ("name", name),
+            ("main_max", main_max),
+            ("main_qty", main_qty),
+            ("extra_max", extra_max),
+            ("extra_qty", extra_qty),
+            ("main_range", range(C.RULE_START, main_max)),
+            ("extra_range", range(C.RULE_START, extra_max)),
+            # bytes used by each line in ResultsData and save files
+            ("line_width", main_qty + extra_qty),
+            ("template", template),
+        ):
+            object.__setattr__(self, slot, value)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"The rules of {self.name} are read only")
+
+    def __repr__(self) -> str:
+        return (
+            f"Rule({self.rule_id}, {self.name!r}, {self.main_max}, "
+            f"{self.main_qty}, {self.extra_max}, {self.extra_qty})"
+        )
+
+    def format(self, numbers) -> str:
+        """Return the text used to display a line
+
+        :param numbers: the main numbers followed by the extra numbers
+        :return: str the zero padded main and extra numbers
+        """
+        return self.template.format(*numbers)
+
+
+def validate(
+    name: str, main_max: int, main_qty: int, extra_max: int, extra_qty: int
+) -> None:
+    """Check the rules of a lottery can be generated and stored
+
+    :param name: the name of the lottery
+    :param main_max: the highest main number plus 1
+    :param main_qty: the quantity of main numbers in a line
+    :param extra_max: the highest extra number plus 1, 0 for none
+    :param extra_qty: the quantity of extra numbers in a line, 0 for none
+    :return: None
+    """
+    groups = [("main", main_max, main_qty)]
+    if extra_max or extra_qty:
+        groups.append(("extra", extra_max, extra_qty))
+    for group, maximum, quantity in groups:
+        if not isinstance(maximum, int) or not isinstance(quantity, int):
+            raise ValueError(f"{name}: the {group} rules must be integers")
+        if quantity < 1 or quantity > maximum - C.RULE_START:
+            raise ValueError(
+                f"{name}: cannot choose {quantity} {group} numbers "
+                f"from {C.RULE_START} to {maximum - 1}"
+            )
+        # numbers are stored as one byte each, and the highest number
+        # plus 1 as one byte in the header of a save file, see store.py
+        if maximum > 255:
+            raise ValueError(f"{name}: {group} numbers must be below 255")
+
+
+def compile_rules(
+    definitions: List[Tuple[str, list]], first_id: int = 0
+) -> List[Rule]:
+    """Compile rules in the format of C.RULES
+
+    :param definitions: (name, [main_max, main_qty, extra_max, extra_qty])
+    :param first_id: the rule id of the first definition
+    :return: the compiled rules
+    """
+    compiled: List[Rule] = []
+    for rule_id, (name, definition) in enumerate(definitions, start=first_id):
+        if not isinstance(definition, list) or len(definition) != 4:
+            raise ValueError(
+                f"{name}: rules must be [main_max, main_qty, extra_max, extra_qty]"
+            )
+        compiled.append(Rule(rule_id, name, *definition))
+    return compiled
+
+
+def load_rules(file_name: str, first_id: int) -> List[Rule]:
+    """Compile the rules of the lotteries defined in a JSON file
+
+    :param file_name: the rules file
+    :param first_id: the rule id of the first lottery in the file
+    :return: the compiled rules
+    """
+    with open(file_name) as file:
+        definitions = json.load(file)
+    if not isinstance(definitions, dict):
+        raise ValueError(f"{file_name}: expected an object of lottery rules")
+    return compile_rules(
+        [(name.upper(), rule) for name, rule in definitions.items()], first_id
+    )
+
+
+def build_registry(rules_file: Union[str, None]) -> Tuple[Rule, ...]:
+    """Compile the rules of C.RULES and the rules file
+
+    :param rules_file: the rules file, None or missing for none
+    :return: the rules indexed by rule id
+    """
+    compiled = compile_rules([(name, C.RULES[name]) for name in C.LOTTERY_CHOICES])
+    if rules_file and Path(rules_file).is_file():
+        compiled += load_rules(rules_file, len(compiled))
+    names = [rule.name for rule in compiled]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Lotteries defined twice: {', '.join(sorted(duplicates))}")
+    # rule ids are stored as one byte
+    if len(compiled) > 256:
+        raise ValueError("No more than 256 lotteries can be defined")
+    return tuple(compiled)
+
+
+# the rules of every lottery, indexed by rule id
+RULES: Tuple[Rule, ...] = build_registry(C.RULES_FILE)
+_BY_NAME: Dict[str, Rule] = {rule.name: rule for rule in RULES}
+
+
+def get_rule(lottery_type: int) -> Rule:
+    """Return the rules of a lottery
+
+    :param lottery_type: int the rule id of the lottery
+    :return: the rules
+    """
+    # a bool is an int, and a negative index would wrap around
+    if isinstance(lottery_type, bool) or not 0 <= lottery_type < len(RULES):
+        raise ValueError(f"Unknown lottery type {lottery_type}")
+    return RULES[lottery_type]
+
+
+def find_rule(name: str) -> Rule:
+    """Return the rules of a lottery by its name
+
+    :param name: the name of the lottery, in any case
+    :return: the rules
+    """
+    try:
+        return _BY_NAME[name.upper()]
+    except KeyError:
+        raise ValueError(f"Unknown lottery {name}") from None
+
+
+def prize_tiers(rule: Rule) -> List[Tuple[int, int]]:
+    """Return the prize tiers of a lottery, see C.PRIZE_TIERS
+
+    :param rule: the rules of the lottery
+    :return: the main and extra numbers matched of every tier, best first
+    """
+    if rule.name in C.PRIZE_TIERS:
+        return [(main, extra) for main, extra in C.PRIZE_TIERS[rule.name]]
+    return sorted(
+        (
+            (main, extra)
+            for main in range(rule.main_qty + 1)
+            for extra in range(rule.extra_qty + 1)
+            if main or extra
+        ),
+        reverse=True,
+    )
+
+
+def tier_name(main: int, extra: int) -> str:
+    """Return the name of a prize tier
+
+    :param main: the main numbers matched
+    :param extra: the extra numbers matched
+    :return: str e.g. 5+2 or 3
+    """
+    return f"{main}+{extra}" if extra else str(main)
+
+
+def names() -> List[str]:
+    """Return the names of the lotteries in rule id order
+
+    :return: the names of every lottery
+    """
+    return [rule.name for rule in RULES]
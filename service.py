@@ -0,0 +1,583 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator local service, without wxPython
+
+A small asyncio HTTP/1.1 server, on a local TCP port or a Unix socket,
+offering the actions of the GUI to other programs as JSON:
+
+    POST /generate  {"type": "LOTTO", "lines": 2, "save": false,
+                     "unique": false}, as generate_numbers
+    GET  /show?type=LOTTO[&batch=ID][&start=0][&count=N], as show_saved
+    POST /delete    {"type": "LOTTO"}, as delete_saved_file
+    GET  /status    the counts of requests and of generated batches
+
+The generate requests of a lottery arriving together, e.g. read in the
+same turn of the event loop, are served from one batch generated in a
+single call, vectorized with NumPy if it is installed. The rules and the
+random number generator of each lottery are kept between requests.
+Connections are kept alive, and Client reuses them.
+"""
+from typing import Dict, List, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+import asyncio
+import http.client
+import json
+import logging
+import queue
+import socket
+import constants as C
+import dedup
+import engine
+import randomness
+import rules
+from archive import Archive
+
+try:
+    import bulk
+except ImportError:
+    bulk = None
+
+logger = logging.getLogger("lottery.service")
+
+REASONS: Dict[int, str] = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class ServiceError(Exception):
+    """An error response of the service
+    """
+
+    def __init__(self, message: str, status: int) -> None:
+        Exception.__init__(self, message)
+        self.status: int = status
+
+
+def find_lottery(value) -> rules.Rule:
+    """Return the rules of the lottery of a request
+
+    :param value: the rule id or the name of the lottery
+    :return: the rules
+    """
+    if isinstance(value, int):
+        return rules.get_rule(value)
+    if str(value).isdigit():
+        return rules.get_rule(int(value))
+    return rules.find_rule(str(value))
+
+
+def lines_json(rule: rules.Rule, data) -> str:
+    """Format packed lines as a JSON array with a single % operation
+
+    :param rule: the rules of the lottery
+    :param data: bytes like object of packed lines
+    :return: str the array of {"main": [...], "extra": [...]} objects
+    """
+    count: int = len(data) // rule.line_width
+    main = ",".join(["%d"] * rule.main_qty)
+    extra = ",".join(["%d"] * rule.extra_qty)
+    template = ",".join([f'{{"main":[{main}],"extra":[{extra}]}}'] * count)
+    return "[" + template % tuple(data) + "]"
+
+
+def unique_lines(directory: str, rule_id: int, number_of_lines: int) -> bytes:
+    """Generate packed lines repeating no line of a saved batch
+
+    Blocking, so run in a thread with an archive of its own, as an SQLite
+    connection is used by the thread that opened it.
+
+    :param directory: the directory of the archive
+    :param rule_id: the lottery
+    :param number_of_lines: the number of lines
+    :return: bytes the packed lines
+    """
+    with Archive(directory) as archive:
+        seen = dedup.history(archive, rule_id)
+    return b"".join(engine.generate_chunks(rule_id, number_of_lines, seen=seen))
+
+
+def save_lines(directory: str, rule_id: int, data) -> int:
+    """Save packed lines to the archive
+
+    Blocking, so run in a thread with an archive of its own.
+
+    :param directory: the directory of the archive
+    :param rule_id: the lottery
+    :param data: bytes like object of packed lines
+    :return: int the id of the saved batch
+    """
+    with Archive(directory) as archive:
+        return archive.add(rule_id, data).batch_id
+
+
+class Lottery:
+    """The state of a lottery kept between requests: its rules, its
+    random number generator and the generate requests waiting for the
+    next batch
+    """
+
+    def __init__(self, rule: rules.Rule) -> None:
+        self.rule: rules.Rule = rule
+        if bulk is None:
+            self.rng = randomness.python_random()
+        else:
+            self.rng = randomness.numpy_generator()
+        self.waiting: List[Tuple[int, asyncio.Future]] = []
+        self.waiting_lines: int = 0
+
+    def generate(self, number_of_lines: int) -> bytes:
+        """Generate packed lines from the lottery's generator
+
+        :param number_of_lines: the number of lines
+        :return: bytes the packed lines
+        """
+        if bulk is None:
+            return b"".join(
+                engine.generate_chunks(
+                    self.rule.rule_id, number_of_lines, self.rng, number_of_lines
+                )
+            )
+        lines = bulk.generate_bulk(self.rule.rule_id, number_of_lines, self.rng)
+        return lines.packed().tobytes()
+
+
+class Service:
+    """The request handlers of the service, run on the event loop
+
+    Reading the whole history of a lottery and saving a batch block, so
+    they run in the default executor, keeping the other connections
+    served meanwhile.
+    """
+
+    def __init__(self, archive: Archive) -> None:
+        self.archive: Archive = archive
+        self.lotteries: Dict[int, Lottery] = {}
+        self.requests: int = 0
+        # the batches generated to serve the requests
+        self.batches: int = 0
+
+    def lottery(self, value) -> Lottery:
+        """Return the state of the lottery of a request
+
+        :param value: the rule id or the name of the lottery
+        :return: the state, created by the first request for the lottery
+        """
+        rule = find_lottery(value)
+        if rule.rule_id not in self.lotteries:
+            self.lotteries[rule.rule_id] = Lottery(rule)
+        return self.lotteries[rule.rule_id]
+
+    def generate_lines(self, lottery: Lottery, number_of_lines: int) -> asyncio.Future:
+        """Ask for lines from the next batch of a lottery
+
+        The batch is generated once the event loop has handled the
+        requests ready, or at once if C.SERVICE_BATCH_LINES are waiting.
+
+        :param lottery: the state of the lottery
+        :param number_of_lines: the number of lines
+        :return: a future of the packed lines
+        """
+        future = asyncio.get_running_loop().create_future()
+        if not lottery.waiting:
+            asyncio.get_running_loop().call_soon(self.flush, lottery)
+        lottery.waiting.append((number_of_lines, future))
+        lottery.waiting_lines += number_of_lines
+        if lottery.waiting_lines >= C.SERVICE_BATCH_LINES:
+            self.flush(lottery)
+        return future
+
+    def flush(self, lottery: Lottery) -> None:
+        """Generate one batch for the waiting requests of a lottery
+
+        :param lottery: the state of the lottery
+        :return: None
+        """
+        if not lottery.waiting:
+            return
+        waiting, lottery.waiting = lottery.waiting, []
+        total, lottery.waiting_lines = lottery.waiting_lines, 0
+        try:
+            data = memoryview(lottery.generate(total))
+        except Exception as error:
+            for _, future in waiting:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        self.batches += 1
+        start: int = 0
+        for number_of_lines, future in waiting:
+            end: int = start + number_of_lines * lottery.rule.line_width
+            if not future.done():
+                future.set_result(data[start:end])
+            start = end
+
+    async def generate_numbers(self, query: dict, body: dict) -> Tuple[int, str]:
+        """Generate lines, optionally saving them to the archive
+
+        :param query: the query parameters, not used
+        :param body: type, lines, save and unique
+        :return: the status and the JSON response
+        """
+        lottery = self.lottery(body.get("type", C.LOTTERY_DEFAULT))
+        rule = lottery.rule
+        number_of_lines = body.get("lines", C.DEFAULT_LINES)
+        # a bool is an int
+        if (
+            isinstance(number_of_lines, bool)
+            or not isinstance(number_of_lines, int)
+            or not C.MIN_LINES <= number_of_lines <= C.SERVICE_MAX_LINES
+        ):
+            raise ValueError(
+                f"From {C.MIN_LINES} to {C.SERVICE_MAX_LINES} lines can be generated"
+            )
+        loop = asyncio.get_running_loop()
+        directory = str(self.archive.directory)
+        if body.get("unique"):
+            # the lines depend on the archive so are not batched
+            data = await loop.run_in_executor(
+                None, unique_lines, directory, rule.rule_id, number_of_lines
+            )
+        else:
+            data = await self.generate_lines(lottery, number_of_lines)
+        fields = {"lottery": rule.name}
+        if body.get("save"):
+            fields["batch_id"] = await loop.run_in_executor(
+                None, save_lines, directory, rule.rule_id, data
+            )
+        return 200, json.dumps(fields)[:-1] + ',"lines":' + lines_json(rule, data) + "}"
+
+    async def show_saved(self, query: dict, body: dict) -> Tuple[int, str]:
+        """Return the lines of the latest, or of a chosen, saved batch
+
+        :param query: type, batch, and start and count to return part of
+        a large batch
+        :param body: not used
+        :return: the status and the JSON response
+        """
+        rule = find_lottery(query.get("type", C.LOTTERY_DEFAULT))
+        if "batch" in query:
+            info = self.archive.get(int(query["batch"]))
+        else:
+            info = self.archive.latest(rule.rule_id)
+        if info is None:
+            return 404, json.dumps({"error": f"No saved {rule.name} numbers were found"})
+        rule = rules.get_rule(info.lottery_type)
+        start = int(query.get("start", 0))
+        count = min(int(query.get("count", C.SERVICE_MAX_LINES)), C.SERVICE_MAX_LINES)
+        if start < 0 or count < 0:
+            raise ValueError("start and count must not be negative")
+        # only the blocks of the lines asked for of a compressed batch are
+        # decompressed
+        with self.archive.reader(info) as reader:
+            lines = lines_json(rule, reader.get_lines(start, start + count))
+        fields = {
+            "lottery": rule.name,
+            "batch_id": info.batch_id,
+            "date": info.date,
+            "total_lines": info.lines,
+            "start": start,
+        }
+        return 200, json.dumps(fields)[:-1] + ',"lines":' + lines + "}"
+
+    async def delete_saved_file(self, query: dict, body: dict) -> Tuple[int, str]:
+        """Delete the latest saved batch of a lottery
+
+        :param query: not used
+        :param body: type
+        :return: the status and the JSON response
+        """
+        rule = find_lottery(body.get("type", C.LOTTERY_DEFAULT))
+        info = self.archive.latest(rule.rule_id)
+        if info is None:
+            return 404, json.dumps({"error": f"No saved {rule.name} numbers were found"})
+        self.archive.delete(info)
+        return 200, json.dumps({"lottery": rule.name, "deleted": info.batch_id})
+
+    async def status(self, query: dict, body: dict) -> Tuple[int, str]:
+        """Return the counts of the service
+
+        :param query: not used
+        :param body: not used
+        :return: the status and the JSON response
+        """
+        return 200, json.dumps(
+            {
+                "program": C.PROGRAM,
+                "version": C.VERSION,
+                "requests": self.requests,
+                "batches": self.batches,
+                "lotteries": [state.rule.name for state in self.lotteries.values()],
+            }
+        )
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, str]:
+        """Call the handler of a request
+
+        :param method: the HTTP method
+        :param target: the path and query
+        :param body: the request body, JSON for POST
+        :return: the status and the JSON response
+        """
+        routes = {
+            "/generate": ("POST", self.generate_numbers),
+            "/show": ("GET", self.show_saved),
+            "/delete": ("POST", self.delete_saved_file),
+            "/status": ("GET", self.status),
+        }
+        url = urlsplit(target)
+        if url.path not in routes:
+            return 404, json.dumps({"error": f"Unknown path {url.path}"})
+        allowed, handler = routes[url.path]
+        if method != allowed:
+            return 405, json.dumps({"error": f"Use {allowed} for {url.path}"})
+        try:
+            arguments = json.loads(body) if body else {}
+            if not isinstance(arguments, dict):
+                raise ValueError("The request body must be a JSON object")
+            return await handler(dict(parse_qsl(url.query)), arguments)
+        except ValueError as error:
+            return 400, json.dumps({"error": str(error)})
+        except Exception as error:
+            logger.exception("%s %s failed", method, target)
+            return 500, json.dumps({"error": str(error)})
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve the requests of a connection until the client closes it
+
+        :param reader: the stream of the requests
+        :param writer: the stream of the responses
+        :return: None
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, target, version = request_line.split(" ", 2)
+                headers = {}
+                for header in header_lines:
+                    name, _, value = header.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                keep_alive: bool = (
+                    version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                )
+                self.requests += 1
+                if length > C.SERVICE_MAX_BODY:
+                    status, payload = 413, json.dumps({"error": "Request too large"})
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method, target, body)
+                content = payload.encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(content)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                    f"\r\n".encode("latin-1")
+                    + content
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # the client has gone or sent a malformed request
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(
+    directory: str = C.ARCHIVE_DIR,
+    host: str = C.SERVICE_HOST,
+    port: int = C.SERVICE_PORT,
+    socket_path: Union[str, None] = None,
+) -> None:
+    """Run the service until cancelled
+
+    :param directory: the directory of the archive
+    :param host: the address to listen on, only the local host is safe
+    :param port: the TCP port to listen on
+    :param socket_path: the Unix socket to listen on instead of a port
+    :return: None
+    """
+    with Archive(directory) as archive:
+        service = Service(archive)
+        if socket_path is None:
+            server = await asyncio.start_server(service.handle, host, port)
+        else:
+            server = await asyncio.start_unix_server(service.handle, socket_path)
+        logger.info(
+            "%s listening on %s",
+            C.PROGRAM,
+            ", ".join(str(sock.getsockname()) for sock in server.sockets),
+        )
+        async with server:
+            await server.serve_forever()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """An HTTP connection over a Unix socket
+    """
+
+    def __init__(self, socket_path: str, timeout: float = C.SERVICE_TIMEOUT) -> None:
+        http.client.HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.socket_path: str = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class Client:
+    """A client of the service keeping its connections open
+
+    Up to pool_size idle connections are kept and reused by the next
+    requests, so a request does not pay for a new connection. A client
+    can be shared by several threads.
+    """
+
+    def __init__(
+        self,
+        host: str = C.SERVICE_HOST,
+        port: int = C.SERVICE_PORT,
+        socket_path: Union[str, None] = None,
+        pool_size: int = C.SERVICE_POOL_SIZE,
+        timeout: float = C.SERVICE_TIMEOUT,
+    ) -> None:
+        self.host: str = host
+        self.port: int = port
+        self.socket_path: Union[str, None] = socket_path
+        self.timeout: float = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=pool_size)
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the idle connections
+
+        :return: None
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.socket_path is not None:
+            return UnixHTTPConnection(self.socket_path, self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method: str, path: str, payload: Union[dict, None] = None) -> dict:
+        """Send a request and return its JSON response
+
+        :param method: GET or POST
+        :param path: the path and query
+        :param payload: the JSON body of a POST
+        :return: dict the response
+        """
+        body = None if payload is None else json.dumps(payload)
+        headers = {"Content-Type": "application/json"} if body else {}
+        try:
+            connection, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            connection, reused = self._connect(), False
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            connection.close()
+            if not reused:
+                raise
+            # the service closed the idle connection, e.g. it restarted
+            return self.request(method, path, payload)
+        except Exception:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            try:
+                self._idle.put_nowait(connection)
+            except queue.Full:
+                connection.close()
+        result = json.loads(data)
+        if response.status != 200:
+            raise ServiceError(result.get("error", response.reason), response.status)
+        return result
+
+    def generate(
+        self,
+        lottery: Union[int, str] = C.LOTTERY_DEFAULT,
+        lines: int = C.DEFAULT_LINES,
+        save: bool = False,
+        unique: bool = False,
+    ) -> dict:
+        """Generate lines
+
+        :param lottery: the rule id or the name of the lottery
+        :param lines: the number of lines
+        :param save: True to save the lines to the archive
+        :param unique: True to never repeat a line of any saved batch
+        :return: dict of the lottery, the lines and the batch_id if saved
+        """
+        return self.request(
+            "POST",
+            "/generate",
+            {"type": lottery, "lines": lines, "save": save, "unique": unique},
+        )
+
+    def show(
+        self,
+        lottery: Union[int, str] = C.LOTTERY_DEFAULT,
+        batch: Union[int, None] = None,
+        start: int = 0,
+        count: int = C.SERVICE_MAX_LINES,
+    ) -> dict:
+        """Return the lines of the latest, or of a chosen, saved batch
+
+        :param lottery: the rule id or the name of the lottery
+        :param batch: the id of a saved batch, None for the latest
+        :param start: the index of the first line to return
+        :param count: the most lines to return
+        :return: dict of the batch and its lines
+        """
+        query = f"/show?type={lottery}&start={start}&count={count}"
+        if batch is not None:
+            query += f"&batch={batch}"
+        return self.request("GET", query)
+
+    def delete(self, lottery: Union[int, str] = C.LOTTERY_DEFAULT) -> dict:
+        """Delete the latest saved batch of a lottery
+
+        :param lottery: the rule id or the name of the lottery
+        :return: dict of the lottery and the id of the deleted batch
+        """
+        return self.request("POST", "/delete", {"type": lottery})
+
+    def status(self) -> dict:
+        """Return the counts of the service
+
+        :return: dict of the requests and batches served
+        """
+        return self.request("GET", "/status")
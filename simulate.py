@@ -0,0 +1,163 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator Monte Carlo simulation of draws against a batch
+
+Every line and every simulated draw is a bitset of its main numbers and
+one of its extra numbers, so the numbers a line matches are a popcount
+of the two bitsets ANDed. Draws are simulated in blocks of
+C.SIMULATE_BLOCK_DRAWS, each with its own stream spawned from the root
+seed as in bulk.iter_blocks, and each block is matched against the
+lines C.SIMULATE_CHUNK_CELLS line and draw pairs at a time, so memory
+use is bounded whatever the number of draws. Requires NumPy.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, NamedTuple, Tuple, Union
+import os
+import numpy as np
+import constants as C
+import rules
+from bulk import BulkLines, popcount, sample_matrix
+
+
+class Simulation(NamedTuple):
+    """The matches of every line of a batch over the simulated draws
+    """
+
+    lottery_type: int
+    draws: int
+    # histogram[line, main matched, extra matched], the number of draws
+    histogram: np.ndarray
+
+    def tiers(self) -> Dict[str, int]:
+        """Return the wins of every prize tier, over all lines and draws
+
+        :return: the count by tier name, best tier first
+        """
+        totals = self.histogram.sum(axis=0)
+        return {
+            rules.tier_name(main, extra): int(totals[main, extra])
+            for main, extra in rules.prize_tiers(rules.get_rule(self.lottery_type))
+        }
+
+    def wins(self) -> np.ndarray:
+        """Return the number of draws in which each line wins a prize
+
+        :return: int64 vector, one count per line
+        """
+        tiers = rules.prize_tiers(rules.get_rule(self.lottery_type))
+        return sum(self.histogram[:, main, extra] for main, extra in tiers)
+
+
+def number_masks(numbers: np.ndarray, maximum: int) -> np.ndarray:
+    """Return the bitset of the numbers of every row
+
+    :param numbers: matrix of distinct numbers, one row per line or draw
+    :param maximum: the highest number plus 1
+    :return: matrix of one row of words per row of numbers, a single
+    word of the smallest unsigned type that fits up to 64 numbers
+    """
+    masks = np.zeros((numbers.shape[0], -(-maximum // 64)), dtype=np.uint64)
+    rows = np.arange(numbers.shape[0])
+    for column in range(numbers.shape[1]):
+        values = numbers[:, column].astype(np.uint64)
+        masks[rows, (values >> np.uint64(6)).astype(np.intp)] |= np.uint64(1) << (
+            values & np.uint64(63)
+        )
+    # smaller words halve the memory traffic of every step
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if maximum <= np.iinfo(dtype).bits:
+            return masks.astype(dtype)
+    return masks
+
+
+def match_counts(lines: np.ndarray, draws: np.ndarray) -> np.ndarray:
+    """Return the numbers every line matches in every draw
+
+    :param lines: bitsets of the lines, see number_masks
+    :param draws: bitsets of the draws
+    :return: uint8 matrix, one row per line and one column per draw
+    """
+    counts = popcount(lines[:, np.newaxis, 0] & draws[np.newaxis, :, 0])
+    for word in range(1, lines.shape[1]):
+        counts += popcount(lines[:, np.newaxis, word] & draws[np.newaxis, :, word])
+    return counts.astype(np.uint8, copy=False)
+
+
+def simulate_block(
+    args: Tuple[int, np.ndarray, np.ndarray, int, np.random.SeedSequence]
+) -> np.ndarray:
+    """Worker process entry point simulating one block of draws
+
+    :param args: lottery_type, the main and extra bitsets of the lines,
+    the number of draws and the block's seed
+    :return: int64 histogram[line, main matched, extra matched]
+    """
+    lottery_type, main_masks, extra_masks, draws, seed = args
+    rule = rules.get_rule(lottery_type)
+    rng = np.random.default_rng(seed)
+    number_of_lines: int = main_masks.shape[0]
+    extra_bins: int = rule.extra_qty + 1
+    bins: int = (rule.main_qty + 1) * extra_bins
+    offsets = (np.arange(number_of_lines, dtype=np.int32) * bins)[:, np.newaxis]
+    histogram = np.zeros(number_of_lines * bins, dtype=np.int64)
+
+    drawn_main = number_masks(
+        sample_matrix(rule.main_max, rule.main_qty, draws, rng), rule.main_max
+    )
+    if rule.extra_qty:
+        drawn_extra = number_masks(
+            sample_matrix(rule.extra_max, rule.extra_qty, draws, rng), rule.extra_max
+        )
+    step: int = max(1, C.SIMULATE_CHUNK_CELLS // number_of_lines)
+    for start in range(0, draws, step):
+        combined = match_counts(main_masks, drawn_main[start:start + step])
+        if bins > 256:
+            combined = combined.astype(np.uint16)
+        if rule.extra_qty:
+            combined *= extra_bins
+            combined += match_counts(extra_masks, drawn_extra[start:start + step])
+        histogram += np.bincount((combined + offsets).ravel(), minlength=histogram.size)
+    return histogram.reshape(number_of_lines, rule.main_qty + 1, extra_bins)
+
+
+def simulate(
+    lottery_type: int,
+    lines: BulkLines,
+    draws: int,
+    seed: Union[int, np.random.SeedSequence, None] = None,
+    workers: Union[int, None] = 1,
+) -> Simulation:
+    """Match a batch of lines against simulated draws
+
+    A fixed seed gives the same draws whatever the number of workers.
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param lines: the lines, e.g. from bulk.batch_matrix
+    :param draws: the number of draws to simulate
+    :param seed: root seed for a reproducible run, None for a random one
+    :param workers: number of processes, None for one per CPU
+    :return: the matches of every line
+    """
+    if draws < 1:
+        raise ValueError("At least 1 draw must be simulated")
+    if not len(lines):
+        raise ValueError("The batch has no lines")
+    rule = rules.get_rule(lottery_type)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    main_masks = number_masks(lines.main, rule.main_max)
+    extra_masks = number_masks(lines.extra, max(rule.extra_max, 1))
+
+    def tasks() -> Iterator[tuple]:
+        for start in range(0, draws, C.SIMULATE_BLOCK_DRAWS):
+            size: int = min(C.SIMULATE_BLOCK_DRAWS, draws - start)
+            yield lottery_type, main_masks, extra_masks, size, seed.spawn(1)[0]
+
+    if workers == 1 or draws <= C.SIMULATE_BLOCK_DRAWS:
+        histogram = sum(map(simulate_block, tasks()))
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            histogram = sum(pool.map(simulate_block, tasks()))
+    return Simulation(lottery_type, draws, histogram)
@@ -0,0 +1,709 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator binary results store
+
+A save file is a fixed size header followed by the numbers of every
+line packed as one byte per number, main numbers first, in the same
+layout ResultsData uses in memory. Alternatively the lines are stored
+as their ranks, see combinatorics.py, which takes 3 or 4 bytes rather
+than 5 to 7 per line but has to be decoded when the batch is read.
+
+The ranks can also be stored in blocks of C.STORE_BLOCK_LINES lines,
+each compressed with zlib or lzma, followed by an index of the offsets
+of the blocks, so a line is read by decompressing only its block, see
+BatchReader.
+
+A save file is written under a temporary name in its directory, flushed
+to disk and renamed over its name in one step, so a reader, or a crash,
+never sees a partly written file, and readers need no lock.
+"""
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Tuple, Union
+import contextlib
+import lzma
+import mmap
+import os
+import struct
+import time
+import zlib
+import combinatorics
+import constants as C
+import rules
+
+try:
+    import fcntl
+except ImportError:
+    # advisory locks are not taken where there is no fcntl, e.g. Windows
+    fcntl = None
+
+# magic, version, lottery_type, main_max, main_qty, extra_max, extra_qty,
+# encoding, codec and lines per block of the compressed blocks, date,
+# number of lines. Files from before blocks have zero codec and block
+# lines, in what were reserved bytes.
+HEADER = struct.Struct("<4sBBBBBBBBIdQ")
+# the offsets of the blocks, from the end of the header, and of the end
+# of the last block, stored after the blocks
+BLOCK_OFFSET = struct.Struct("<Q")
+# a raw LZMA2 stream per block, a dictionary larger than a block is of
+# no use and slows decompression down
+LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 6, "dict_size": 1 << 16}]
+
+
+class Header(NamedTuple):
+    """The description of a saved batch
+    """
+
+    lottery_type: int
+    main_max: int
+    main_qty: int
+    extra_max: int
+    extra_qty: int
+    # time.time() when the batch was saved
+    date: float
+    lines: int
+    # C.STORE_PACKED, C.STORE_RANKED or C.STORE_BLOCKED
+    encoding: int = C.STORE_PACKED
+    # the compression and lines of each block of C.STORE_BLOCKED, else 0
+    codec: int = 0
+    block_lines: int = 0
+
+    @property
+    def line_width(self) -> int:
+        """Return the number of bytes used by each line
+
+        :return: int the quantity of main and extra numbers
+        """
+        return self.main_qty + self.extra_qty
+
+    @property
+    def stored_width(self) -> int:
+        """Return the number of bytes used by each line in the file
+
+        :return: int the line width or the width of a rank
+        """
+        if self.encoding != C.STORE_PACKED:
+            return combinatorics.rank_width(rules.get_rule(self.lottery_type))
+        return self.line_width
+
+    @property
+    def blocks(self) -> int:
+        """Return the number of compressed blocks
+
+        :return: int the number of blocks, 0 unless C.STORE_BLOCKED
+        """
+        if self.encoding != C.STORE_BLOCKED:
+            return 0
+        return -(-self.lines // self.block_lines)
+
+    @property
+    def lottery_type_name(self) -> str:
+        """Return the name of the lottery of the batch
+
+        :return: str the name of the lottery
+        """
+        return rules.get_rule(self.lottery_type).name
+
+
+def make_header(
+    lottery_type: int,
+    data_size: int,
+    date: Union[float, None] = None,
+    encoding: int = C.STORE_PACKED,
+    codec: int = C.STORE_ZLIB,
+) -> Header:
+    """Describe a batch of packed lines
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param data_size: the size in bytes of the packed lines
+    :param date: time the batch was saved, None for now
+    :param encoding: C.STORE_PACKED, C.STORE_RANKED or C.STORE_BLOCKED
+    :param codec: the compression of C.STORE_BLOCKED, one of
+    C.STORE_CODECS
+    :return: the header of the batch
+    """
+    rule = rules.get_rule(lottery_type)
+    lines, rest = divmod(data_size, rule.line_width)
+    if rest:
+        raise ValueError("The data does not hold a whole number of lines")
+    if encoding == C.STORE_BLOCKED and codec not in C.STORE_CODECS.values():
+        raise ValueError(f"Unknown compression {codec}")
+    blocked: bool = encoding == C.STORE_BLOCKED
+    return Header(
+        lottery_type,
+        rule.main_max,
+        rule.main_qty,
+        rule.extra_max,
+        rule.extra_qty,
+        time.time() if date is None else date,
+        lines,
+        encoding,
+        codec if blocked else 0,
+        C.STORE_BLOCK_LINES if blocked else 0,
+    )
+
+
+def pack_header(header: Header) -> bytes:
+    """Return the header as stored in a save file
+
+    :param header: the header to pack
+    :return: bytes of size HEADER.size
+    """
+    return HEADER.pack(
+        C.STORE_MAGIC,
+        C.STORE_VERSION,
+        header.lottery_type,
+        header.main_max,
+        header.main_qty,
+        header.extra_max,
+        header.extra_qty,
+        header.encoding,
+        header.codec,
+        header.block_lines,
+        header.date,
+        header.lines,
+    )
+
+
+def unpack_header(buffer) -> Header:
+    """Read the header at the start of a save file
+
+    :param buffer: bytes like object holding at least the header
+    :return: the header
+    """
+    if len(buffer) < HEADER.size:
+        raise ValueError("The file is too short to be a save file")
+    magic, version, *groups, encoding, codec, block_lines, date, lines = (
+        HEADER.unpack_from(buffer)
+    )
+    if magic != C.STORE_MAGIC or version != C.STORE_VERSION:
+        raise ValueError("The file is not a save file of a known version")
+    if encoding not in (C.STORE_PACKED, C.STORE_RANKED, C.STORE_BLOCKED):
+        raise ValueError(f"The file has an unknown encoding {encoding}")
+    if encoding == C.STORE_BLOCKED and (
+        codec not in C.STORE_CODECS.values() or not block_lines
+    ):
+        raise ValueError(f"The file has an unknown compression {codec}")
+    lottery_type, *numbers = groups
+    # the lines are decoded with the rules of the registry, which must
+    # still be those of the lottery they were saved for
+    rule = rules.get_rule(lottery_type)
+    if tuple(numbers) != (rule.main_max, rule.main_qty, rule.extra_max, rule.extra_qty):
+        raise ValueError(
+            f"The file was saved for other rules than those of {rule.name}"
+        )
+    return Header(*groups, date, lines, encoding, codec, block_lines)
+
+
+def encode_lines(lottery_type: int, buffer) -> bytes:
+    """Encode packed lines as their ranks
+
+    NumPy is used if it is installed, see bulk.py.
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param buffer: bytes like object of packed lines
+    :return: the ranks as combinatorics.encode_ranks stores them
+    """
+    try:
+        import bulk
+    except ImportError:
+        return combinatorics.encode_ranks(rules.get_rule(lottery_type), buffer)
+    lines = bulk.batch_matrix(make_header(lottery_type, len(buffer)), buffer)
+    return bulk.encode_ranks(lottery_type, lines).tobytes()
+
+
+def decode_lines(lottery_type: int, buffer) -> bytes:
+    """Decode lines encoded by encode_lines
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param buffer: bytes like object of the ranks
+    :return: the packed lines
+    """
+    try:
+        import bulk
+    except ImportError:
+        return combinatorics.decode_ranks(rules.get_rule(lottery_type), buffer)
+    return bulk.decode_ranks(lottery_type, buffer).packed().tobytes()
+
+
+@contextlib.contextmanager
+def file_lock(file_name: str, shared: bool = False):
+    """Hold an advisory lock on a file for the statements of a with block
+
+    The lock is taken on a lock file next to the file, so the file can
+    be replaced while the lock is held.
+
+    :param file_name: the path name of the file
+    :param shared: True for a shared lock, to read, False for an
+    exclusive lock, to write
+    :return: a context manager
+    """
+    if fcntl is None:
+        yield
+        return
+    path = Path(file_name + C.LOCK_FILE_TYPE)
+    if not path.parent.exists():
+        path.parent.mkdir(parents=True)
+    with open(path, "ab") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def sync_directory(directory: Path) -> None:
+    """Flush the entries of a directory, e.g. a rename, to disk
+
+    :param directory: the directory
+    :return: None
+    """
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    handle = os.open(str(directory), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(handle)
+    finally:
+        os.close(handle)
+
+
+class AtomicFile:
+    """A binary file written under a temporary name and renamed over its
+    name, once flushed to disk, when committed
+    """
+
+    def __init__(self, file_name: str) -> None:
+        self.path = Path(file_name)
+        if not self.path.parent.exists():
+            self.path.parent.mkdir(parents=True)
+        self.temporary = self.path.with_name(
+            f".{self.path.name}.{os.urandom(8).hex()}{C.TEMP_FILE_TYPE}"
+        )
+        self.file = open(self.temporary, "xb")
+
+    def sync(self) -> None:
+        """Flush the file to disk and close it, without renaming it
+
+        :return: None
+        """
+        if not self.file.closed:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+    def commit(self, file_name: Union[str, None] = None) -> Path:
+        """Flush the file to disk and rename it over its name
+
+        :param file_name: the name to give the file, in the same
+        directory, None for the name it was opened with
+        :return: the path of the file
+        """
+        path = self.path if file_name is None else Path(file_name)
+        self.sync()
+        os.replace(self.temporary, path)
+        sync_directory(path.parent)
+        return path
+
+    def abort(self) -> None:
+        """Close and remove the temporary file
+
+        :return: None
+        """
+        self.file.close()
+        with contextlib.suppress(FileNotFoundError):
+            self.temporary.unlink()
+
+
+def compress_block(codec: int, data) -> bytes:
+    """Compress a block of ranks
+
+    :param codec: one of C.STORE_CODECS
+    :param data: bytes like object of the ranks
+    :return: bytes the compressed block
+    """
+    if codec == C.STORE_LZMA:
+        return lzma.compress(data, format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+    return zlib.compress(data)
+
+
+def decompress_block(codec: int, data) -> bytes:
+    """Decompress a block compressed by compress_block
+
+    :param codec: one of C.STORE_CODECS
+    :param data: bytes like object of the compressed block
+    :return: bytes the ranks
+    """
+    if codec == C.STORE_LZMA:
+        return lzma.decompress(data, format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+    return zlib.decompress(data)
+
+
+def block_offsets(header: Header, content, file_name: str) -> Tuple[int, ...]:
+    """Read the index of the compressed blocks of a save file
+
+    :param header: the header of the file
+    :param content: bytes like object of the whole file
+    :param file_name: the name of the file, for errors
+    :return: the offset in content of every block and of the index
+    """
+    count: int = header.blocks + 1
+    start: int = len(content) - count * BLOCK_OFFSET.size
+    if start < HEADER.size:
+        raise ValueError(f"File <{file_name}> is truncated")
+    offsets = struct.unpack_from(f"<{count}Q", content, start)
+    if offsets[-1] + HEADER.size != start:
+        raise ValueError(f"File <{file_name}> is truncated")
+    return tuple(HEADER.size + offset for offset in offsets)
+
+
+def write_batch(
+    file_name: str,
+    lottery_type: int,
+    buffer,
+    date: Union[float, None] = None,
+    encoding: int = C.STORE_PACKED,
+    codec: int = C.STORE_ZLIB,
+) -> Header:
+    """Save a batch of packed lines with a single write
+
+    :param file_name: the save file path name including its extension
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param buffer: bytes like object of the packed lines,
+    e.g. ResultsData.get_buffer()
+    :param date: time the batch was saved, None for now
+    :param encoding: C.STORE_PACKED, C.STORE_RANKED or C.STORE_BLOCKED
+    :param codec: the compression of C.STORE_BLOCKED, one of
+    C.STORE_CODECS
+    :return: the header written
+    """
+    if encoding == C.STORE_BLOCKED:
+        # the blocks are compressed one at a time
+        return write_stream(file_name, lottery_type, (buffer,), date, encoding, codec)
+    data = memoryview(buffer).cast("B")
+    header = make_header(lottery_type, len(data), date, encoding)
+    output = AtomicFile(file_name)
+    try:
+        output.file.write(pack_header(header))
+        if encoding == C.STORE_RANKED:
+            output.file.write(encode_lines(lottery_type, data))
+        else:
+            output.file.write(data)
+        output.commit()
+    except BaseException:
+        output.abort()
+        raise
+    return header
+
+
+class BatchWriter:
+    """Write a batch of packed lines a chunk at a time
+
+    The header is written with the final number of lines when the
+    writer is closed, only the current chunk, or block, is ever held in
+    memory. Leaving a with block on an exception discards the batch.
+    """
+
+    def __init__(
+        self,
+        file_name: str,
+        lottery_type: int,
+        date: Union[float, None] = None,
+        encoding: int = C.STORE_PACKED,
+        codec: int = C.STORE_ZLIB,
+    ) -> None:
+        self.lottery_type: int = lottery_type
+        self.date: float = time.time() if date is None else date
+        self.encoding: int = encoding
+        self.codec: int = codec
+        # the size of the packed lines written, whatever the encoding
+        self.size: int = 0
+        # the size of the file, known once finished
+        self.file_size: int = 0
+        # the header is checked before anything is written
+        header = make_header(lottery_type, 0, self.date, encoding, codec)
+        self._block_size: int = header.block_lines * rules.get_rule(
+            lottery_type
+        ).line_width
+        # the lines of the block being filled and the offsets of the
+        # blocks written
+        self._pending = bytearray()
+        self._offsets: List[int] = [0]
+        self._output = AtomicFile(file_name)
+        self._file = self._output.file
+        self._committed: bool = False
+        self._file.write(bytes(HEADER.size))
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, error_type, *_) -> None:
+        if error_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write_block(self, data) -> None:
+        block = compress_block(self.codec, encode_lines(self.lottery_type, data))
+        self._file.write(block)
+        self._offsets.append(self._offsets[-1] + len(block))
+
+    def write(self, chunk) -> None:
+        """Append a chunk of packed lines
+
+        :param chunk: bytes like object of whole packed lines
+        :return: None
+        """
+        data = memoryview(chunk).cast("B")
+        if self.encoding == C.STORE_BLOCKED:
+            self._pending += data
+            full: int = len(self._pending) // self._block_size * self._block_size
+            for start in range(0, full, self._block_size):
+                self._write_block(
+                    memoryview(self._pending)[start:start + self._block_size]
+                )
+            del self._pending[:full]
+        elif self.encoding == C.STORE_RANKED:
+            self._file.write(encode_lines(self.lottery_type, data))
+        else:
+            self._file.write(data)
+        self.size += len(data)
+
+    def finish(self) -> Header:
+        """Write the last block, the index and the header and flush the
+        file to disk, without renaming it
+
+        :return: the header written
+        """
+        header = make_header(
+            self.lottery_type, self.size, self.date, self.encoding, self.codec
+        )
+        if not self._file.closed:
+            if self.encoding == C.STORE_BLOCKED:
+                if self._pending:
+                    self._write_block(self._pending)
+                    self._pending = bytearray()
+                self._file.write(struct.pack(f"<{len(self._offsets)}Q", *self._offsets))
+            self.file_size = self._file.tell()
+            self._file.seek(0)
+            self._file.write(pack_header(header))
+            self._output.sync()
+        return header
+
+    def commit(self, file_name: Union[str, None] = None) -> None:
+        """Rename the finished file over its name, the only step taken
+        while the archive index is locked
+
+        :param file_name: the name to save the batch as, in the same
+        directory, None for the name it was opened with
+        :return: None
+        """
+        if not self._committed:
+            self._output.commit(file_name)
+            self._committed = True
+
+    def close(self, file_name: Union[str, None] = None) -> Header:
+        """Write the header and commit the file
+
+        :param file_name: the name to save the batch as, in the same
+        directory, None for the name it was opened with
+        :return: the header written
+        """
+        header = self.finish()
+        self.commit(file_name)
+        return header
+
+    def abort(self) -> None:
+        """Discard the batch unless it has been committed
+
+        :return: None
+        """
+        if not self._committed:
+            self._output.abort()
+
+
+def write_stream(
+    file_name: str,
+    lottery_type: int,
+    chunks: Iterable,
+    date: Union[float, None] = None,
+    encoding: int = C.STORE_PACKED,
+    codec: int = C.STORE_ZLIB,
+) -> Header:
+    """Save a stream of chunks of packed lines
+
+    :param file_name: the save file path name including its extension
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param chunks: bytes like objects of whole packed lines,
+    e.g. from engine.generate_chunks
+    :param date: time the batch was saved, None for now
+    :param encoding: C.STORE_PACKED, C.STORE_RANKED or C.STORE_BLOCKED
+    :param codec: the compression of C.STORE_BLOCKED, one of
+    C.STORE_CODECS
+    :return: the header written
+    """
+    with BatchWriter(file_name, lottery_type, date, encoding, codec) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer.close()
+
+
+def decode_content(header: Header, content, file_name: str) -> memoryview:
+    """Return the packed lines of the whole content of a save file
+
+    :param header: the header of the file
+    :param content: bytes like object of the whole file
+    :param file_name: the name of the file, for errors
+    :return: a view of the packed lines, into content if they are not
+    encoded
+    """
+    if header.encoding == C.STORE_BLOCKED:
+        offsets = block_offsets(header, content, file_name)
+        view = memoryview(content)
+        ranks = b"".join(
+            decompress_block(header.codec, view[start:end])
+            for start, end in zip(offsets, offsets[1:])
+        )
+        del view
+        if len(ranks) != header.lines * header.stored_width:
+            raise ValueError(f"File <{file_name}> is corrupt")
+        return memoryview(decode_lines(header.lottery_type, ranks))
+    end: int = HEADER.size + header.lines * header.stored_width
+    if len(content) < end:
+        raise ValueError(f"File <{file_name}> is truncated")
+    if header.encoding == C.STORE_RANKED:
+        return memoryview(decode_lines(header.lottery_type, content[HEADER.size:end]))
+    return memoryview(content)[HEADER.size:end]
+
+
+def read_batch(file_name: str) -> Tuple[Header, memoryview]:
+    """Load a batch of packed lines with a single read
+
+    :param file_name: the save file path name including its extension
+    :return: the header and a view of the packed lines
+    """
+    with open(file_name, "rb") as file:
+        content = file.read()
+    header = unpack_header(content)
+    return header, decode_content(header, content, file_name)
+
+
+def map_batch(file_name: str) -> Tuple[Header, memoryview]:
+    """Open a batch of packed lines without reading it into memory
+
+    The file is memory mapped, pages are only read when the lines are
+    accessed. The mapping is closed when the returned view, and every
+    view taken from it, is no longer used. Lines stored as ranks are
+    decoded into memory.
+
+    :param file_name: the save file path name including its extension
+    :return: the header and a read only view of the packed lines
+    """
+    with open(file_name, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        header = unpack_header(mapped)
+        if header.encoding == C.STORE_PACKED:
+            return header, decode_content(header, mapped, file_name)
+        with mapped:
+            return header, decode_content(header, mapped, file_name)
+    except BaseException:
+        mapped.close()
+        raise
+
+
+class BatchReader:
+    """Random access to the lines of a save file
+
+    The file is memory mapped and only the lines asked for are read.
+    Of a file of compressed blocks only the blocks holding those lines
+    are decompressed, the last one is kept for the next read, and only
+    the ranks of those lines are decoded.
+    """
+
+    def __init__(self, file_name: str) -> None:
+        with open(file_name, "rb") as file:
+            self._mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.header: Header = unpack_header(self._mapped)
+            self._offsets: Tuple[int, ...] = ()
+            if self.header.encoding == C.STORE_BLOCKED:
+                self._offsets = block_offsets(self.header, self._mapped, file_name)
+            elif len(self._mapped) < (
+                HEADER.size + self.header.lines * self.header.stored_width
+            ):
+                raise ValueError(f"File <{file_name}> is truncated")
+        except BaseException:
+            self._mapped.close()
+            raise
+        self._block: Tuple[int, bytes] = (-1, b"")
+
+    def __enter__(self) -> "BatchReader":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.header.lines
+
+    def close(self) -> None:
+        """Close the file
+
+        :return: None
+        """
+        self._mapped.close()
+
+    def block(self, number: int) -> bytes:
+        """Return the ranks of the lines of a compressed block
+
+        :param number: the index of the block
+        :return: bytes the ranks
+        """
+        if self._block[0] != number:
+            start, end = self._offsets[number], self._offsets[number + 1]
+            self._block = (
+                number,
+                decompress_block(self.header.codec, self._mapped[start:end]),
+            )
+        return self._block[1]
+
+    def get_lines(self, start: int, stop: int) -> bytes:
+        """Return a range of lines
+
+        :param start: the index of the first line
+        :param stop: the index after the last line
+        :return: bytes the packed lines
+        """
+        start, stop, _ = slice(start, stop).indices(self.header.lines)
+        if start >= stop:
+            return b""
+        width: int = self.header.stored_width
+        if self.header.encoding == C.STORE_PACKED:
+            return self._mapped[HEADER.size + start * width:HEADER.size + stop * width]
+        if self.header.encoding == C.STORE_RANKED:
+            ranks = self._mapped[HEADER.size + start * width:HEADER.size + stop * width]
+        else:
+            # only the ranks of the lines asked for are decoded
+            block_lines: int = self.header.block_lines
+            parts: List[bytes] = []
+            for number in range(start // block_lines, (stop - 1) // block_lines + 1):
+                first: int = number * block_lines
+                parts.append(
+                    self.block(number)[
+                        max(start - first, 0) * width:
+                        (min(stop, first + block_lines) - first) * width
+                    ]
+                )
+            ranks = b"".join(parts)
+        return decode_lines(self.header.lottery_type, ranks)
+
+    def get_line(self, item: int) -> bytes:
+        """Return a line
+
+        :param item: the index of the line
+        :return: bytes the packed line
+        """
+        if not 0 <= item < self.header.lines:
+            raise IndexError("line index out of range")
+        return self.get_lines(item, item + 1)
@@ -0,0 +1,32 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Reproducible runs of the block generation of bulk.py
+"""
+import pytest
+import constants as C
+
+pytest.importorskip("numpy")
+import bulk  # noqa: E402
+
+LOTTERY = 1
+SEED = 2019
+# crosses the boundary of two blocks and ends part way through a third
+LINES: int = C.BULK_BLOCK_LINES * 2 + 100
+
+
+@pytest.mark.parametrize("method", [C.BULK_SAMPLE, C.BULK_RANK])
+def test_workers_give_same_lines(method):
+    one = bulk.generate_parallel(LOTTERY, LINES, SEED, workers=1, method=method)
+    two = bulk.generate_parallel(LOTTERY, LINES, SEED, workers=2, method=method)
+    assert len(one.packed()) == LINES
+    assert one.packed().tobytes() == two.packed().tobytes()
+
+
+@pytest.mark.parametrize("lines", [100, C.BULK_BLOCK_LINES, C.BULK_BLOCK_LINES + 1])
+def test_shorter_run_is_prefix(lines):
+    longer = bulk.generate_parallel(LOTTERY, LINES, SEED, workers=2).packed()
+    shorter = bulk.generate_parallel(LOTTERY, lines, SEED, workers=1).packed()
+    assert len(shorter) == lines
+    assert shorter.tobytes() == longer[:lines].tobytes()
@@ -0,0 +1,62 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Round trips of the line ranks of combinatorics.py and bulk.py
+"""
+import pytest
+import combinatorics
+import engine
+import rules
+
+ALL_RULES = [rules.find_rule(name) for name in rules.names()]
+
+
+def sample_lines(rule: rules.Rule) -> bytes:
+    """Return packed lines including the first and the last line ranked
+
+    :param rule: the rules of the lottery
+    :return: bytes the packed lines
+    """
+    last: int = combinatorics.line_count(rule) - 1
+    ends = bytes(
+        combinatorics.unrank_line(rule, 0) + combinatorics.unrank_line(rule, last)
+    )
+    return ends + b"".join(engine.generate_chunks(rule.rule_id, 500, 1))
+
+
+@pytest.mark.parametrize("rule", ALL_RULES, ids=lambda rule: rule.name)
+def test_rank_line_round_trip(rule):
+    data = sample_lines(rule)
+    ranks = combinatorics.rank_buffer(rule, data)
+    assert ranks[0] == 0
+    assert ranks[1] == combinatorics.line_count(rule) - 1
+    width: int = rule.line_width
+    for index, rank in enumerate(ranks):
+        assert 0 <= rank < combinatorics.line_count(rule)
+        line = data[index * width:(index + 1) * width]
+        assert bytes(combinatorics.unrank_line(rule, rank)) == line
+
+
+@pytest.mark.parametrize("rule", ALL_RULES, ids=lambda rule: rule.name)
+def test_encode_ranks_round_trip(rule):
+    data = sample_lines(rule)
+    encoded = combinatorics.encode_ranks(rule, data)
+    lines: int = len(data) // rule.line_width
+    assert len(encoded) == lines * combinatorics.rank_width(rule)
+    assert combinatorics.decode_ranks(rule, encoded) == data
+
+
+@pytest.mark.parametrize("rule", ALL_RULES, ids=lambda rule: rule.name)
+def test_bulk_ranks_match_combinatorics(rule):
+    pytest.importorskip("numpy")
+    import bulk
+
+    data = sample_lines(rule)
+    lines = bulk.unrank_lines(
+        rule.rule_id, combinatorics.rank_buffer(rule, data)
+    )
+    assert lines.packed().tobytes() == data
+    encoded = combinatorics.encode_ranks(rule, data)
+    assert bulk.encode_ranks(rule.rule_id, lines).tobytes() == encoded
+    assert bulk.decode_ranks(rule.rule_id, encoded).packed().tobytes() == data
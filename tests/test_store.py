@@ -0,0 +1,121 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Round trips of the save file formats of store.py
+"""
+import os
+import pytest
+import constants as C
+import engine
+import rules
+import store
+from archive import Archive
+
+LOTTERY = 1
+WIDTH: int = rules.get_rule(LOTTERY).line_width
+# crosses the boundary of two blocks and ends part way through a third
+LINES: int = C.STORE_BLOCK_LINES * 2 + 100
+FORMATS = [
+    (C.STORE_PACKED, C.STORE_ZLIB),
+    (C.STORE_RANKED, C.STORE_ZLIB),
+    (C.STORE_BLOCKED, C.STORE_ZLIB),
+    (C.STORE_BLOCKED, C.STORE_LZMA),
+]
+
+
+@pytest.fixture(scope="module")
+def data() -> bytes:
+    return b"".join(engine.generate_chunks(LOTTERY, LINES, 1))
+
+
+def save(tmp_path, data, encoding: int, codec: int) -> str:
+    file_name = str(tmp_path / f"batch{C.SAVE_FILE_TYPE}")
+    store.write_batch(file_name, LOTTERY, data, 0.0, encoding, codec)
+    return file_name
+
+
+@pytest.mark.parametrize("encoding, codec", FORMATS)
+def test_read_round_trip(tmp_path, data, encoding, codec):
+    file_name = save(tmp_path, data, encoding, codec)
+    header, lines = store.read_batch(file_name)
+    assert (header.lines, header.encoding) == (LINES, encoding)
+    assert bytes(lines) == data
+    header, lines = store.map_batch(file_name)
+    assert bytes(lines) == data
+    del lines
+
+
+@pytest.mark.parametrize("encoding, codec", FORMATS)
+def test_reader_across_blocks(tmp_path, data, encoding, codec):
+    file_name = save(tmp_path, data, encoding, codec)
+    boundary: int = C.STORE_BLOCK_LINES
+    with store.BatchReader(file_name) as reader:
+        assert len(reader) == LINES
+        for item in (0, boundary - 1, boundary, LINES - 1):
+            assert reader.get_line(item) == data[item * WIDTH:(item + 1) * WIDTH]
+        start, stop = boundary - 10, 2 * boundary + 10
+        assert reader.get_lines(start, stop) == data[start * WIDTH:stop * WIDTH]
+        assert reader.get_lines(0, LINES + 1) == data
+        assert reader.get_lines(5, 5) == b""
+        with pytest.raises(IndexError):
+            reader.get_line(LINES)
+
+
+@pytest.mark.parametrize("encoding, codec", FORMATS)
+def test_stream_matches_batch(tmp_path, data, encoding, codec):
+    file_name = str(tmp_path / f"stream{C.SAVE_FILE_TYPE}")
+    # chunks that do not line up with the blocks
+    chunk: int = 1000 * WIDTH
+    chunks = (data[start:start + chunk] for start in range(0, len(data), chunk))
+    store.write_stream(file_name, LOTTERY, chunks, 0.0, encoding, codec)
+    with open(file_name, "rb") as file:
+        streamed = file.read()
+    with open(save(tmp_path, data, encoding, codec), "rb") as file:
+        assert streamed == file.read()
+
+
+@pytest.mark.parametrize("encoding, codec", FORMATS)
+def test_empty_batch(tmp_path, encoding, codec):
+    file_name = save(tmp_path, b"", encoding, codec)
+    header, lines = store.read_batch(file_name)
+    assert header.lines == 0 and bytes(lines) == b""
+    with store.BatchReader(file_name) as reader:
+        assert len(reader) == 0
+        assert reader.get_lines(0, 10) == b""
+
+
+@pytest.mark.parametrize("encoding, codec", FORMATS)
+def test_truncated_file(tmp_path, data, encoding, codec):
+    file_name = save(tmp_path, data, encoding, codec)
+    with open(file_name, "rb") as file:
+        content = file.read()
+    with open(file_name, "wb") as file:
+        file.write(content[:-3])
+    with pytest.raises(ValueError):
+        store.read_batch(file_name)
+    with pytest.raises(ValueError):
+        store.BatchReader(file_name)
+
+
+def test_blocked_is_smaller(tmp_path, data):
+    packed: int = os.path.getsize(save(tmp_path, data, C.STORE_PACKED, C.STORE_ZLIB))
+    blocked = save(tmp_path, data, C.STORE_BLOCKED, C.STORE_ZLIB)
+    assert os.path.getsize(blocked) < packed
+
+
+def test_recode_keeps_smaller_file(tmp_path, data):
+    with Archive(str(tmp_path)) as archive:
+        # too few lines for compression to pay for the block index
+        small = archive.add(LOTTERY, data[:3 * WIDTH])
+        content = archive.batch_path(small).read_bytes()
+        size: int = len(content)
+        assert archive.recode(small, C.STORE_BLOCKED) == (size, size)
+        assert archive.batch_path(small).read_bytes() == content
+        large = archive.add(LOTTERY, data)
+        before, after = archive.recode(large, C.STORE_BLOCKED)
+        assert after < before
+        assert after == os.path.getsize(archive.batch_path(large))
+        with archive.reader(large) as reader:
+            assert bytes(reader.get_lines(0, LINES)) == data
+    assert not list(tmp_path.glob(f"*{C.TEMP_FILE_TYPE}"))
@@ -0,0 +1,185 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator wheels, lines covering a pool of chosen numbers
+
+A wheel guarantees that if condition of the drawn main numbers are in
+the pool at least one line matches guarantee of them, e.g. 3 if 4. It is
+a covering design: every group of condition numbers of the pool, a
+target, must share at least guarantee numbers with some line.
+
+Targets and lines are bitsets of the pool positions, so how much a line
+covers is a popcount over the targets not yet covered. Lines are chosen
+greedily, each the best of candidates built around an uncovered target
+as counted on a sample of the uncovered targets, then lines made
+redundant by later ones are removed. Requires NumPy.
+"""
+from itertools import combinations
+from math import comb
+from typing import List, Sequence, Union
+import numpy as np
+import constants as C
+import rules
+from bulk import BulkLines, popcount, sample_matrix
+
+
+def check_wheel(
+    rule: rules.Rule, pool: Sequence[int], guarantee: int, condition: int
+) -> None:
+    """Check a wheel can be built
+
+    :param rule: the rules of the lottery
+    :param pool: the chosen main numbers
+    :param guarantee: the numbers matched by at least one line
+    :param condition: the drawn numbers in the pool
+    :return: None
+    """
+    if len(set(pool)) != len(pool):
+        raise ValueError("The pool has repeated numbers")
+    outside = [number for number in pool if number not in rule.main_range]
+    if outside:
+        raise ValueError(
+            f"{rule.name}: numbers must be from {C.RULE_START} "
+            f"to {rule.main_max - 1}, not {outside[0]}"
+        )
+    if not rule.main_qty <= len(pool) <= C.WHEEL_MAX_POOL:
+        raise ValueError(
+            f"{rule.name}: the pool must have {rule.main_qty} "
+            f"to {C.WHEEL_MAX_POOL} numbers"
+        )
+    if not 1 <= guarantee <= min(condition, rule.main_qty):
+        raise ValueError(
+            f"Cannot guarantee {guarantee} of {condition} with "
+            f"{rule.main_qty} numbers a line"
+        )
+    if condition > min(len(pool), rule.main_qty):
+        raise ValueError(f"At most {rule.main_qty} drawn numbers can be in the pool")
+    if comb(len(pool), condition) > C.WHEEL_MAX_TARGETS:
+        raise ValueError(
+            f"Too many groups of {condition} numbers in a pool of {len(pool)}"
+        )
+
+
+def subset_masks(size: int, quantity: int) -> np.ndarray:
+    """Return the bitset of every group of positions
+
+    :param size: the number of positions
+    :param quantity: the number of positions in a group
+    :return: uint64 vector, one bitset per group
+    """
+    groups = np.array(list(combinations(range(size), quantity)), dtype=np.uint64)
+    groups = groups.reshape(-1, quantity)
+    return np.bitwise_or.reduce(np.uint64(1) << groups, axis=1)
+
+
+def mask_positions(mask: int) -> List[int]:
+    """Return the positions set in a bitset
+
+    :param mask: the bitset
+    :return: the positions in increasing order
+    """
+    return [position for position in range(mask.bit_length()) if mask >> position & 1]
+
+
+def covered(targets: np.ndarray, line: np.uint64, guarantee: int) -> np.ndarray:
+    """Return which targets a line covers
+
+    :param targets: uint64 bitsets of the targets
+    :param line: the bitset of the line
+    :param guarantee: the numbers a line must share with a target
+    :return: bool vector, True for every covered target
+    """
+    return popcount(targets & line) >= guarantee
+
+
+def cover(
+    pool_size: int,
+    line_qty: int,
+    guarantee: int,
+    condition: int,
+    rng: np.random.Generator,
+    candidates: int = C.WHEEL_CANDIDATES,
+) -> List[int]:
+    """Build a covering design over pool positions
+
+    :param pool_size: the number of positions in the pool
+    :param line_qty: the number of positions in each line
+    :param guarantee: the positions a line must share with a target
+    :param condition: the number of positions in a target
+    :param rng: the random number generator used to build candidates
+    :param candidates: the number of candidate lines tried for each line
+    :return: the bitsets of the lines
+    """
+    targets = subset_masks(pool_size, condition)
+    uncovered = targets
+    rows = np.arange(candidates)[:, np.newaxis]
+    lines: List[int] = []
+    while uncovered.size:
+        target = np.array(mask_positions(int(uncovered[0])))
+        # each candidate shares guarantee numbers with the target, which
+        # it so covers, and has other numbers of the pool at random
+        core = rng.random((candidates, target.size)).argsort(axis=1)
+        keys = rng.random((candidates, pool_size))
+        keys[rows, target[core[:, :guarantee]]] = -1.0
+        chosen = keys.argsort(axis=1)[:, :line_qty].astype(np.uint64)
+        lines_tried = np.bitwise_or.reduce(np.uint64(1) << chosen, axis=1)
+        # candidates are compared on a sample of the uncovered targets
+        sample = uncovered
+        if sample.size > C.WHEEL_SAMPLE:
+            sample = sample[rng.integers(0, sample.size, C.WHEEL_SAMPLE)]
+        counts = np.count_nonzero(
+            popcount(sample & lines_tried[:, np.newaxis]) >= guarantee, axis=1
+        )
+        best = int(lines_tried[counts.argmax()])
+        lines.append(best)
+        uncovered = uncovered[~covered(uncovered, np.uint64(best), guarantee)]
+
+    # remove the lines whose targets are all covered by other lines
+    coverage = np.zeros(targets.size, dtype=np.int32)
+    for line in lines:
+        coverage += covered(targets, np.uint64(line), guarantee)
+    kept: List[int] = []
+    for line in lines:
+        mask = covered(targets, np.uint64(line), guarantee)
+        if (coverage[mask] > 1).all():
+            coverage -= mask
+        else:
+            kept.append(line)
+    return kept
+
+
+def generate_wheel(
+    lottery_type: int,
+    pool: Sequence[int],
+    guarantee: int,
+    condition: Union[int, None] = None,
+    seed: Union[int, None] = None,
+) -> BulkLines:
+    """Generate the lines of a wheel
+
+    The extra numbers, if the lottery has any, are chosen at random.
+
+    :param lottery_type: int the rule id of the lottery, see rules.py
+    :param pool: the chosen main numbers
+    :param guarantee: the numbers matched by at least one line
+    :param condition: the drawn numbers in the pool, None for guarantee
+    :param seed: seed for a reproducible run, None for a random one
+    :return: the lines of the wheel
+    """
+    rule = rules.get_rule(lottery_type)
+    condition = guarantee if condition is None else condition
+    check_wheel(rule, pool, guarantee, condition)
+    pool = sorted(pool)
+    rng = np.random.default_rng(seed)
+
+    lines = cover(len(pool), rule.main_qty, guarantee, condition, rng)
+    main = np.array(
+        [[pool[position] for position in mask_positions(line)] for line in lines],
+        dtype=np.uint8,
+    ).reshape(len(lines), rule.main_qty)
+    if rule.extra_qty:
+        extra = sample_matrix(rule.extra_max, rule.extra_qty, len(lines), rng)
+    else:
+        extra = np.empty((len(lines), 0), dtype=np.uint8)
+    return BulkLines(main, extra)
@@ -0,0 +1,141 @@
+#
+#   Copyright (c) 2019 Bernd Wiesner. bernduwiesner@yahoo.co.uk
+#   All rights reserved
+#
+"""Lottery generator background generation
+
+A GenerateJob generates, and optionally saves, a batch on its own
+thread a chunk at a time. Each chunk and the end of the job are handed
+to callbacks through a post function, wx.CallAfter in the GUI, so the
+callbacks run on the thread of the event loop, which never waits for
+the job. The job can be cancelled between two chunks.
+"""
+from typing import Callable, Union
+import threading
+import time
+import constants as C
+import dedup
+import engine
+import rules
+import store
+from archive import Archive, BatchInfo
+from instrument import Instrument
+
+
+class Cancelled(Exception):
+    """Raised on the job's thread to stop a cancelled job
+    """
+
+
+class GenerateJob(threading.Thread):
+    """Generate a batch of lines on a worker thread
+
+    post is called with a callback and its arguments to run the callback
+    on the event loop, e.g. wx.CallAfter. on_chunk is called with the job
+    and each chunk of packed lines and on_done with the job when it has
+    finished, been cancelled or failed.
+    """
+
+    def __init__(
+        self,
+        lottery_type: int,
+        number_of_lines: int,
+        post: Callable,
+        on_chunk: Callable[["GenerateJob", bytes], None],
+        on_done: Callable[["GenerateJob"], None],
+        save: bool = False,
+        unique: bool = False,
+        chunk_lines: int = C.GUI_CHUNK_LINES,
+    ) -> None:
+        threading.Thread.__init__(self, name="generate", daemon=True)
+        self.lottery_type: int = lottery_type
+        self.rule: rules.Rule = rules.get_rule(lottery_type)
+        self.number_of_lines: int = number_of_lines
+        self.save: bool = save
+        self.unique: bool = unique
+        self.chunk_lines: int = chunk_lines
+        self.instrument = Instrument("generate")
+        # the lines generated so far
+        self.lines: int = 0
+        # the archived batch if the batch was saved
+        self.info: Union[BatchInfo, None] = None
+        self.error: Union[Exception, None] = None
+        self._post = post
+        self._on_chunk = on_chunk
+        self._on_done = on_done
+        self._cancel = threading.Event()
+        self._closing: float = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        """Has the job been cancelled
+
+        :return: bool True if cancel was called
+        """
+        return self._cancel.is_set()
+
+    def cancel(self) -> None:
+        """Stop the job before its next chunk, a partly saved batch is
+        removed from the archive
+
+        :return: None
+        """
+        self._cancel.set()
+
+    def chunks(self, archive: Archive):
+        """Generate the chunks, posting each one to on_chunk
+
+        :param archive: the archive of saved batches
+        :return: an iterator of the chunks
+        """
+        seen = None
+        if self.unique:
+            with self.instrument.stage("history"):
+                seen = dedup.history(archive, self.lottery_type)
+        chunks = engine.generate_chunks(
+            self.lottery_type,
+            self.number_of_lines,
+            None,
+            self.chunk_lines,
+            seen,
+            instrument=self.instrument,
+        )
+        for chunk in chunks:
+            if self.cancelled:
+                raise Cancelled()
+            self.lines += len(chunk) // self.rule.line_width
+            self._post(self._on_chunk, self, chunk)
+            if not self.save:
+                yield chunk
+                continue
+            # the time the archive takes to write the chunk
+            with self.instrument.stage("save"):
+                yield chunk
+        # the archive finishes the file when asked for the next chunk
+        self._closing = time.perf_counter()
+
+    def run(self) -> None:
+        # SQLite connections belong to the thread that opened them
+        try:
+            with Archive() as archive:
+                with self.instrument.stage("generate"):
+                    if self.save:
+                        self.info = archive.add_stream(
+                            self.lottery_type, self.chunks(archive)
+                        )
+                        # finishing the file and entering it in the index
+                        self.instrument.add(
+                            "save", time.perf_counter() - self._closing
+                        )
+                        self.instrument.count(
+                            "bytes", store.HEADER.size + self.lines * self.rule.line_width
+                        )
+                    else:
+                        for _ in self.chunks(archive):
+                            pass
+        except Cancelled:
+            pass
+        except Exception as error:
+            self.error = error
+        self.instrument.count("lines", self.lines)
+        self._post(self._on_done, self)